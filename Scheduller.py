@@ -1,85 +1,35 @@
+import asyncio
 import logging
-import os
-import time
 from datetime import datetime
-from pathlib import Path
-from typing import Tuple
 
-from config.Configuration import Configuration, JFrog, PXEServerConfig, RobotConfig
-from deployment.Deployment import Deployment
-from integration.Artifactory import Artifactory
-from logger.Logger import init_logger
-from utils.Utilities import run_command
+import watchfiles
 
+from config.Configuration import RobotConfig
+from deployment.PxeDeployBase import PxeDeployBase
+from utils.Utilities import run_command_streaming
 
-class Scheduler(object):
-    POLL_REPEAT_TIMEOUT: float = 5.0 * 1
 
-    ARTIFACT_FOLDER_FORMAT: str = '%Y_%m_%d_%H_%M_%S'
+class Scheduler(PxeDeployBase):
+    HOUSEKEEPING_INTERVAL: float = 5.0 * 1
+    POLL_BACKOFF_LIMIT: int = 6
+    POLL_INTERVAL_MAX: float = 300.0
+
+    # Files the deploy pipeline itself writes into artifacts_dir - their change
+    # events must not re-trigger the very deploy that produces them
+    SELF_WRITE_SUFFIXES: tuple = ('.part', '.tmp', '.prepare_state.json')
 
     def __init__(self):
-        self.config: Configuration = Configuration.get_configuration()
-        self.logger: logging.Logger = init_logger()
-        self.deployer: Deployment = Deployment()
+        super().__init__()
 
-        self.jfrog_config: JFrog = self.config.jfrog
-        self.pxe_server_config: PXEServerConfig = self.config.pxe_server
         self.robot_config: RobotConfig = self.config.robot
-
-        try:
-            Path(self.pxe_server_config.artifacts_dir).mkdir(parents=True, exist_ok=True)
-        except OSError as _:
-            raise RuntimeError(f'Failed to create/access an Artifacts folder {self.pxe_server_config.artifacts_dir}')
-
-        self.artifactory: Artifactory = Artifactory(host=self.jfrog_config.host,
-                                                    username=self.jfrog_config.username,
-                                                    password=self.jfrog_config.password)
-
-    def get_latest_local_image(self) -> Tuple[datetime, Path]:
-        path, most_recent = Path(), datetime(year=1, month=1, day=1)
-        for entry in Path(self.pxe_server_config.artifacts_dir).iterdir():
-            if entry.is_dir():
-                folder_data: datetime = datetime.strptime(entry.name, self.ARTIFACT_FOLDER_FORMAT)
-                if folder_data > most_recent:
-                    most_recent = folder_data
-                    path = entry.absolute()
-
-        return most_recent, path
-
-    def download_jfrog_file(self,
-                            remote_path: str,
-                            local_dst_path) -> bool:
-        self.logger.debug(f'Downloading {remote_path} ---> {local_dst_path}')
-        ok, msg = self.artifactory.download_artifact(f'{remote_path}', f'{local_dst_path}')
-        if not ok:
-            self.logger.error(f'Download failed: {msg}')
-            return False
-
-        self.logger.debug(f'OK. {os.path.getsize(local_dst_path)} bytes downloaded')
-        return True
-
-    def download_artifacts(self,
-                           latest_build_date: datetime,
-                           remote_build_folder: str) -> bool:
-        folder_name: str = latest_build_date.strftime(self.ARTIFACT_FOLDER_FORMAT)
-        folder_path: str = f'{self.pxe_server_config.artifacts_dir}/{folder_name}'
-
-        changes_file, image_file_name = 'ChangeSet.txt', Artifactory.IMAGE_FILE_NAME
-        Path(folder_path).mkdir(parents=True, exist_ok=False)
-
-        if not self.download_jfrog_file(f'{remote_build_folder}/{changes_file}',
-                                        f'{folder_path}/{changes_file}'):
-            return False
-        if not self.download_jfrog_file(f'{remote_build_folder}/{image_file_name}',
-                                        f'{folder_path}/{image_file_name}'):
-            return False
-
-        cmd: str = f'ln -fs {folder_path}/{image_file_name} {self.pxe_server_config.sdcard_image_path}'
-        _, err_code = run_command(cmd, print_output=False)
-
-        return True
+        self.local_date: datetime = datetime(year=1, month=1, day=1)
+        self.idle_polls: int = 0
 
     def validate_configuration(self) -> bool:
+        # The banner concatenates ~10 strings - do not build it when DEBUG is off
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return True
+
         start_up_info: str = '\n' + '--' * 100
         start_up_info += f'\n\tStartup time       : {datetime.now()}'
         start_up_info += f'\n\tWorking directory  : {self.pxe_server_config.working_dir}'
@@ -91,9 +41,6 @@ class Scheduler(object):
 
         return True
 
-    def deploy_nodes(self) -> bool:
-        return self.deployer.deploy(nodes=self.config.csl_nodes)
-
     def deploy_and_test(self) -> bool:
         if not self.deploy_nodes():
             self.logger.error(f'Failed to deploy configuration')
@@ -104,30 +51,94 @@ class Scheduler(object):
     def run_tests(self) -> bool:
         self.logger.debug('\n' + '==' * 80 + '\n' + '\t' * 7 + 'Running RobotFramework tests' + '\n' + '==' * 80)
 
+        # Tests run sequentially on purpose: their output streams into a shared log and
+        # they exercise the same freshly deployed fleet
         for test_name in self.robot_config.get_tests():
             cmd: str = f'robot -d {self.robot_config.reports_dir} {self.robot_config.tests_dir}/{test_name}'
-            message, err_code = run_command(cmd)
-            self.logger.debug('\n\n' + message + '\n')
+            err_code: int = run_command_streaming(cmd, self.logger)
+            if err_code:
+                self.logger.error(f'Test run "{test_name}" finished with code {err_code}')
 
         return True
 
+    def check_and_deploy(self) -> bool:
+        latest_build_date, build_folder_path = self.artifactory.get_latest_build()
+        self.logger.debug('Latest JFrog image is : %s. Latest deployed: %s', latest_build_date, self.local_date)
+        if latest_build_date > self.local_date:
+            if not self.download_artifacts(latest_build_date, build_folder_path):
+                # TODO: How to handle ??? Email / Slack notification ???
+                self.logger.error("Failed to download some artifacts")
+            self.local_date = latest_build_date
+            self.deploy_and_test()
+            return True
+
+        self.logger.debug('No need to update (^_^)')
+        return False
+
+    def poll_interval(self) -> float:
+        # Short interval right after activity, exponential backoff (capped at 5 min)
+        # once many polls in a row found nothing new - keeps the Scheduler responsive
+        # after a deploy while cutting idle-hour Artifactory requests
+        return min(self.HOUSEKEEPING_INTERVAL * (1 << min(self.idle_polls, self.POLL_BACKOFF_LIMIT)),
+                   self.POLL_INTERVAL_MAX)
+
+    async def artifactory_poll_loop(self,
+                                    triggers: asyncio.Queue):
+        while True:
+            await triggers.put('artifactory poll')
+            await asyncio.sleep(self.poll_interval())
+
+    @classmethod
+    def _foreign_change(cls, change: watchfiles.Change, path: str) -> bool:
+        return not path.endswith(cls.SELF_WRITE_SUFFIXES)
+
+    async def local_trigger_loop(self,
+                                 triggers: asyncio.Queue):
+        async for _ in watchfiles.awatch(self.pxe_server_config.artifacts_dir,
+                                         watch_filter=self._foreign_change):
+            await triggers.put('artifacts dir change')
+
+    @staticmethod
+    def _drain_triggers(triggers: asyncio.Queue) -> None:
+        while True:
+            try:
+                triggers.get_nowait()
+                triggers.task_done()
+            except asyncio.QueueEmpty:
+                break
+
+    async def deploy_loop(self,
+                          triggers: asyncio.Queue):
+        while True:
+            trigger: str = await triggers.get()
+            # One check covers every queued trigger - collapse the backlog so a
+            # burst of events never turns into back-to-back Artifactory polls
+            self._drain_triggers(triggers)
+            self.logger.debug('Deployment check triggered by: %s', trigger)
+            # The deploy pipeline is blocking (and Deployment.deploy starts its own
+            # asyncio.run for the boot wait, which would raise inside a running
+            # loop) - a worker thread keeps this loop's asyncio.run-free and the
+            # poll/watch loops responsive during a multi-minute deployment
+            deployed: bool = await asyncio.to_thread(self.check_and_deploy)
+            self.idle_polls = 0 if deployed else self.idle_polls + 1
+            triggers.task_done()
+            # Whatever queued up while the deploy ran describes state the deploy
+            # itself wrote into artifacts_dir; the next poll covers anything real
+            self._drain_triggers(triggers)
+
+    async def run_loops(self):
+        # Single queue serializes the deployments no matter which loop triggered the check
+        triggers: asyncio.Queue = asyncio.Queue()
+        await asyncio.gather(self.artifactory_poll_loop(triggers),
+                             self.local_trigger_loop(triggers),
+                             self.deploy_loop(triggers))
+
     def start(self):
         if not self.validate_configuration():
             return
 
-        local_date, _ = self.get_latest_local_image()
-        while True:
-            latest_build_date, build_folder_path = self.artifactory.get_latest_build()
-            self.logger.debug(f'Latest JFrog image is : {latest_build_date}. Latest deployed: {local_date}')
-            if latest_build_date > local_date:
-                if not self.download_artifacts(latest_build_date, build_folder_path):
-                    # TODO: How to handle ??? Email / Slack notification ???
-                    self.logger.error("Failed to download some artifacts")
-                local_date = latest_build_date
-                self.deploy_and_test()
-            else:
-                self.logger.debug('No need to update (^_^)')
-                time.sleep(self.POLL_REPEAT_TIMEOUT)
+        self.local_date, _ = self.get_latest_local_image()
+        asyncio.run(self.run_loops())
 
 
 if __name__ == '__main__':
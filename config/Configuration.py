@@ -2,9 +2,12 @@ from __future__ import annotations
 
 import configparser
 import os
+import pickle
+import threading
 
 from dataclasses import dataclass
-from typing import List
+from pathlib import Path
+from typing import List, Tuple
 from common.CSLNode import CSLNode
 
 
@@ -28,47 +31,61 @@ class PXEServerConfig(object):
     ip_address: str
     filesystem_root: str
     working_dir: str
-    sdcard_image_path: str
-    artifacts_dir: str
+    sdcard_image_path: Path
+    artifacts_dir: Path
     logs_dir: str
+    use_bind_mount: bool = False
 
 
 @dataclass
 class RobotConfig(object):
     tests_dir: str
     reports_dir: str
-    tests: List[str]
+    tests: Tuple[str, ...]
 
-    def get_tests(self) -> List[str]:
-        return [test.strip() for test in str(self.tests).split(',')]
+    def get_tests(self) -> Tuple[str, ...]:
+        return self.tests
 
 
 class Configuration(object):
+    CONFIG_FILE_NAME: str = 'default.conf'
+    CACHE_FILE_NAME: str = '.default.conf.cache'
+
     __instance__: Configuration = None
-    __initialized__: bool = False
+    __lock__: threading.Lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs) -> Configuration:
-        if cls.__instance__ is None:
-            cls.__instance__ = super(Configuration, cls).__new__(cls)
+        with cls.__lock__:
+            if cls.__instance__ is None:
+                cls.__instance__ = super(Configuration, cls).__new__(cls)
         return cls.__instance__
 
     def __init__(self):
-        if self.__initialized__:
+        # '__initialized__' is an instance attribute: flipping it on the class would
+        # leak the 'already initialized' state onto every future instance
+        if getattr(self, '__initialized__', False):
             return
-        self.__initialized__ = True
+        self.__initialized__: bool = True
 
         self.config_dir: str = os.path.dirname(os.path.realpath(__file__))
         self.router: Router = None
         self.jfrog: JFrog = None
         self.robot: RobotConfig = None
         self.pxe_server: PXEServerConfig = None
-        self.csl_nodes: List[CSLNode] = []
+        self.csl_nodes: Tuple[CSLNode, ...] = ()
+
+    @property
+    def config_file_path(self) -> str:
+        return f'{self.config_dir}/{self.CONFIG_FILE_NAME}'
+
+    @property
+    def cache_file_path(self) -> str:
+        return f'{self.config_dir}/{self.CACHE_FILE_NAME}'
 
     def __parse_configuration(self):
         config = configparser.ConfigParser()
 
-        # TODO: Filename to const?? or/and as input parameter ?
-        config_file_path: str = f'{self.config_dir}/default.conf'
+        config_file_path: str = self.config_file_path
         if not config.read(config_file_path):
             raise RuntimeError(f'Failed to read configuration file {config_file_path}')
 
@@ -84,35 +101,69 @@ class Configuration(object):
                            password=jfrog_section.get('password', None))
 
         robot_section: configparser.SectionProxy = config['robot_framework']
+        # The test list is split/validated once here instead of on every run_tests call
         self.robot = RobotConfig(tests_dir=robot_section.get('robot_tests_dir', None),
                                  reports_dir=robot_section.get('robot_reports_dir', None),
-                                 tests=robot_section.get('robot_tests', []))
+                                 tests=tuple(test.strip()
+                                             for test in robot_section.get('robot_tests', '').split(',')
+                                             if test.strip()))
 
         pxe_server_section: configparser.SectionProxy = config['pxe_server']
         self.pxe_server = PXEServerConfig(ip_address=pxe_server_section.get('ip_address', None),
                                           filesystem_root=pxe_server_section.get('pxe_filesystem_root', None),
                                           working_dir=pxe_server_section.get('working_dir', None),
-                                          sdcard_image_path=pxe_server_section.get('sdcard_image_path', None),
-                                          artifacts_dir=pxe_server_section.get('artifacts_dir', None),
-                                          logs_dir=pxe_server_section.get('logs_dir', None))
-
-        csl_nodes: List[str] = [csl_node for csl_node in config if 'comms_sleeve' in csl_node]
-        for csl_node in csl_nodes:
-            section: configparser.SectionProxy = config[csl_node]
-            self.csl_nodes.append(CSLNode(hostname=section.get('hostname', None),
-                                          ip_address=section.get('ip_address', None),
-                                          mac_address=section.get('mac_address', None),
-                                          username=section.get('username', None),
-                                          password=section.get('password', None),
-                                          port=section.getint('port', 0),
-                                          router_port_link=section.getint('router_port_link', 0),
-                                          nfs_folder_name=section.get('nfs_folder_name', None)))
+                                          sdcard_image_path=Path(pxe_server_section.get('sdcard_image_path', '')),
+                                          artifacts_dir=Path(pxe_server_section.get('artifacts_dir', '')),
+                                          logs_dir=pxe_server_section.get('logs_dir', None),
+                                          use_bind_mount=pxe_server_section.getboolean('use_bind_mount', False))
+
+        # sections() skips DEFAULT, and the prefix match avoids picking up any unrelated
+        # section that merely contains the substring somewhere in its name
+        csl_sections: List[str] = [section for section in config.sections()
+                                   if section.startswith('comms_sleeve')]
+        self.csl_nodes = tuple(CSLNode(hostname=config[section].get('hostname', None),
+                                       ip_address=config[section].get('ip_address', None),
+                                       mac_address=config[section].get('mac_address', None),
+                                       username=config[section].get('username', None),
+                                       password=config[section].get('password', None),
+                                       port=config[section].getint('port', 0),
+                                       router_port_link=config[section].getint('router_port_link', 0),
+                                       nfs_folder_name=config[section].get('nfs_folder_name', None))
+                               for section in csl_sections)
+
+    def __load_from_cache(self) -> bool:
+        try:
+            mtime: int = os.stat(self.config_file_path).st_mtime_ns
+            with open(self.cache_file_path, 'rb') as cache_file:
+                cached_mtime, sections = pickle.load(cache_file)
+        except (OSError, pickle.PickleError, ValueError, EOFError):
+            return False
+
+        if cached_mtime != mtime:
+            return False
+
+        self.router, self.jfrog, self.robot, self.pxe_server, self.csl_nodes = sections
+        return True
+
+    def __save_to_cache(self) -> None:
+        try:
+            mtime: int = os.stat(self.config_file_path).st_mtime_ns
+            sections = (self.router, self.jfrog, self.robot, self.pxe_server, self.csl_nodes)
+            with open(self.cache_file_path, 'wb') as cache_file:
+                pickle.dump((mtime, sections), cache_file)
+        except (OSError, pickle.PickleError):
+            # Cache is best-effort: the parsed in-memory configuration is still valid
+            pass
 
     @classmethod
     def get_configuration(cls) -> Configuration:
         if not Configuration.__instance__:
-            Configuration.__instance__ = Configuration()
-            Configuration.__instance__.__parse_configuration()
+            instance: Configuration = Configuration()
+            # Reuse the parse result memoized on disk (keyed by the config file mtime),
+            # so restarts of the Scheduler/Deployer skip the INI re-parse
+            if not instance.__load_from_cache():
+                instance.__parse_configuration()
+                instance.__save_to_cache()
         return Configuration.__instance__
 
     def __repr__(self) -> str:
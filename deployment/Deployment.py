@@ -1,12 +1,13 @@
+import asyncio
 import logging
 import time
 
-from typing import List
+from typing import List, Set
 from logger.Logger import init_logger
 from router.POEPort import POEPort
 from common.CSLNode import CSLNode
 from ssh.SSHClient import SSHClient
-from utils.Utilities import wait_for_ports, wait_for_hosts
+from utils.Utilities import wait_for_hosts_ready
 from deployment.PreparePXEBootFS import ImageWrapper
 from router.MikroTikClient import MikroTikClient
 from integration.Artifactory import Artifactory
@@ -18,6 +19,8 @@ class Deployment(object):
     CSL_WAIT_FOR_BOOT_TIMEOUT: float = 60.0 * 5.0
     CSL_BOOT_WARN_TIMEOUT: float = CSL_WAIT_FOR_BOOT_TIMEOUT * 2
 
+    LOG_SEPARATOR: str = '=' * 180
+
     def __init__(self):
         self.config: Configuration = Configuration.get_configuration()
         self.logger: logging.Logger = init_logger()
@@ -26,9 +29,12 @@ class Deployment(object):
         self.jfrog_config: JFrog = self.config.jfrog
         self.pxe_server_config: PXEServerConfig = self.config.pxe_server
 
+        # One authenticated SSH transport is held open for the whole deploy session:
+        # every PoE command only pays for a cheap channel open instead of a full handshake
         ssh_client = SSHClient(hostname=self.router_config.host,
                                username=self.router_config.username,
-                               password=self.router_config.password)
+                               password=self.router_config.password,
+                               keep_alive=True)
 
         self.router_client: MikroTikClient = MikroTikClient(ssh_client)
         self.artifactory: Artifactory = Artifactory(host=self.jfrog_config.host,
@@ -42,13 +48,16 @@ class Deployment(object):
     def switch_comms_sleeves_power(self,
                                    csl_list: List[CSLNode],
                                    state: POEPort.Power) -> bool:
-        ports_names: List[str] = [f'ether{node.router_port_link}' for node in csl_list]
-        for ether_port in ports_names:
-            self.logger.debug(f'Powering \'{state}\' the {ether_port} . . .')
-            if not self.router_client.set_poe_port_power(ether_port, state):
-                self.logger.error(f'ERROR: Failed to set PoE port {ether_port} to {state} state')
-                return False
-            self.logger.debug(f'Done')
+        # Set for the O(1) membership checks below; the ordered list drives the toggling
+        ports_names: Set[str] = {f'ether{node.router_port_link}' for node in csl_list}
+        ordered_ports: List[str] = sorted(ports_names)
+
+        # One batched RouterOS script toggles all the ports in a single round-trip
+        self.logger.debug('Powering \'%s\' the ports %s . . .', state, ordered_ports)
+        if not self.router_client.set_poe_ports_power(ordered_ports, state):
+            self.logger.error('ERROR: Failed to set PoE ports %s to %s state', ordered_ports, state)
+            return False
+        self.logger.debug('Done')
 
         self.logger.debug(f"Checking the CommsSleeve's states...")
         ports: List[POEPort] = self.router_client.get_poe_ports()
@@ -58,24 +67,28 @@ class Deployment(object):
 
         for poe_port in ports:
             if poe_port.name in ports_names and poe_port.state != state:
-                self.logger.error(f'ERROR: PoE port {poe_port.name} is in {poe_port.state} state. ({state} expected)')
+                self.logger.error('ERROR: PoE port %s is in %s state. (%s expected)',
+                                  poe_port.name, poe_port.state, state)
                 return False
 
         return True
 
     def deploy(self,
                nodes: List[CSLNode]) -> bool:
-        self.logger.debug('Comms Sleeves to re-Boot:')
-        for node in nodes:
-            self.logger.debug(f'\t\t{node}')
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('Comms Sleeves to re-Boot:')
+            for node in nodes:
+                self.logger.debug('\t\t%s', node)
 
         if not self.switch_comms_sleeves_power(nodes, POEPort.Power.Off):
             return False
 
         self.logger.debug('Preparing the PXE boot NFS filesystem......')
-        for node in nodes:
-            # TODO: Check result
-            result: bool = self.wrapper.prepare_pxe_boot_configuration(node)
+        # All the nodes boot from the same image, so the loop device / partition mounts /
+        # NFS restart are paid once for the whole fleet instead of once per node
+        if not self.wrapper.prepare_all(nodes):
+            self.logger.error('ERROR: Failed to prepare the PXE boot NFS filesystem for some nodes')
+            return False
 
         if not self.switch_comms_sleeves_power(nodes, POEPort.Power.On):
             return False
@@ -83,14 +96,22 @@ class Deployment(object):
         self.logger.debug('Waiting for the CSL to boot.....')
 
         boot_start_time: float = time.time()
-        wait_for_hosts([node.ip_address for node in nodes], timeout=self.CSL_WAIT_FOR_BOOT_TIMEOUT)
-        wait_for_ports([node.ip_address for node in nodes], timeout=self.CSL_WAIT_FOR_BOOT_TIMEOUT, port=22)
+        # Ping and SSH-port probes run concurrently for all nodes, so the wait ends as soon
+        # as the slowest host is fully up instead of doing two serial polling passes
+        all_ready: bool = asyncio.run(wait_for_hosts_ready([node.ip_address for node in nodes],
+                                                           timeout=self.CSL_WAIT_FOR_BOOT_TIMEOUT))
         boot_duration: float = time.time() - boot_start_time
 
+        if not all_ready:
+            self.logger.error(f'ERROR: Not all the CSLs became reachable '
+                              f'within {self.CSL_WAIT_FOR_BOOT_TIMEOUT} seconds')
+            return False
+
         if boot_duration > self.CSL_BOOT_WARN_TIMEOUT:
             self.logger.warning(f"CSL'=s boot took longer than expected: {boot_duration} seconds")
 
-        # TODO: print --> logging
-        print('==' * 90, '\n', '\t' * 7, boot_duration, '\n', '==' * 90, sep='')
+        self.logger.debug(self.LOG_SEPARATOR)
+        self.logger.info('Boot duration: %.3fs', boot_duration)
+        self.logger.debug(self.LOG_SEPARATOR)
 
         return True
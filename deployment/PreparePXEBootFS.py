@@ -1,16 +1,74 @@
+import contextlib
+import errno
+import hashlib
+import json
 import logging
+import mmap
+import re
+import shutil
+import stat
 import sys
 import os
+import threading
 
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from common.CSLNode import CSLNode
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from logger.Logger import init_logger
 from utils.Utilities import run_command, FileUtilities
 from config.Configuration import Configuration
 
 
+# Compiled once at import; each config file is rewritten in a single anchored-regex
+# pass over its bytes instead of an O(lines x replacements) Python substring scan
+_SSHD_PATTERNS: List[Tuple[re.Pattern, bytes]] = [
+    (re.compile(rb'^[#\s]*PermitRootLogin\b.*$', re.M), b'PermitRootLogin yes'),
+    (re.compile(rb'^[#\s]*PasswordAuthentication\b.*$', re.M), b'PasswordAuthentication yes'),
+    (re.compile(rb'^.*/etc/ssh/ssh_host_rsa_key.*$', re.M), b'HostKey /etc/ssh/ssh_host_rsa_key'),
+]
+
+# The root mount line: a non-comment first field followed by '/' as the second field
+_FSTAB_ROOT_RE: re.Pattern = re.compile(rb'^(?!#)\S+[ \t]+/[ \t].*$', re.M)
+
+
+@dataclass
+class _CSLPaths(object):
+    """Every per-node filesystem location, resolved once per prepare instead of
+    re-concatenated in each helper"""
+    boot_dir: str
+    root_dir: str
+    ssh_config: str
+    fstab: str
+    hostname: str
+    cmdline: str
+    tftp_symlink: str
+
+    @classmethod
+    def for_node(cls,
+                 pxe_fs_root: str,
+                 node: CSLNode) -> '_CSLPaths':
+        # If the 'nfs_folder_name' attribute is specified then it will be used as the NFS
+        # filesystem folder for the CommsSleeve, otherwise name will be generated
+        # automatically from the node's MAC address just by removing the ':' symbols from it
+        nfs_dir_name: str = node.nfs_folder_name if node.nfs_folder_name else node.mac_address.replace(':', '')
+        csl_root: str = os.path.join(pxe_fs_root, nfs_dir_name)
+
+        boot_dir: str = os.path.join(csl_root, ImageWrapper.BOOT_FS_DIR_NAME)
+        root_dir: str = os.path.join(csl_root, ImageWrapper.ROOT_FS_DIR_NAME)
+
+        return cls(boot_dir=boot_dir,
+                   root_dir=root_dir,
+                   ssh_config=f'{root_dir}{ImageWrapper.SSHD_CONFIG_PATH}',
+                   fstab=f'{root_dir}{ImageWrapper.FSTAB_CONFIG_PATH}',
+                   hostname=f'{root_dir}{ImageWrapper.HOSTNAME_FILE_PATH}',
+                   cmdline=os.path.join(boot_dir, ImageWrapper.CMDLINE_FINE_NAME),
+                   tftp_symlink=os.path.join(pxe_fs_root, ImageWrapper.TFTP_ROOT_DIR_NAME,
+                                             node.mac_address.replace(':', '-')))
+
+
 class ImageWrapper(object):
     BOOT_FS_DIR_NAME: str = 'boot'
     ROOT_FS_DIR_NAME: str = 'rootfs'
@@ -23,6 +81,19 @@ class ImageWrapper(object):
 
     HOSTS_FILE_PATH: str = '/etc/hosts'
 
+    # Built once at class scope; per CSL only the two placeholders are formatted in
+    CMDLINE_TEMPLATE: str = ('rootwait console=tty1 console=ttyS0,115200 pcie_aspm=off selinux=1 enforcing=0 '
+                             'ip=dhcp root=/dev/nfs nfsroot={ip}:{root},vers=4.1,proto=tcp')
+
+    PREPARE_STATE_FILE_NAME: str = '.prepare_state.json'
+    IMAGE_MOUNT_DIR_NAME: str = '.image'
+    IMAGE_MOUNT_MARKER_NAME: str = '.mounted_image.json'
+    TEMPLATES_DIR_NAME: str = '.templates'
+    TEMPLATE_COMPLETE_MARKER: str = '.complete'
+
+    # Below this size the mmap setup/teardown costs more than it saves
+    MMAP_COPY_MIN_SIZE: int = 16 * 1024 * 1024
+
     def __init__(self,
                  image_path: str,
                  server_ip_address: str) -> None:
@@ -33,6 +104,8 @@ class ImageWrapper(object):
         self.img_path: Path = Path(image_path)
         self.server_ip_address: str = server_ip_address
 
+        self._state_lock: threading.Lock = threading.Lock()
+
     class LoopContext(object):
 
         def __init__(self,
@@ -75,7 +148,8 @@ class ImageWrapper(object):
 
         def __enter__(self):
             self.logger.debug(f'\tMounting {self.device} to {self.mount_point}')
-            output, status = run_command(cmd=f'mount -o ro {self.device} {self.mount_point}', print_output=False)
+            output, status = run_command(cmd=f'mount -o ro,noatime {self.device} {self.mount_point}',
+                                         print_output=False)
             if 0 != status:
                 raise RuntimeError(f'Failed to mount device "{self.device}" to "{self.mount_point}". '
                                    f'Status = {status}. output: {output}')
@@ -95,39 +169,296 @@ class ImageWrapper(object):
             self.logger.debug(f'\tOK')
 
     class NFSServiceContext(object):
+        """
+        Refreshes the NFS exports around a filesystem update. The server is not
+        stopped any more: 'exportfs -ra' re-reads /etc/exports in milliseconds and
+        keeps the existing client sessions warm, where the old stop/start kicked
+        every client off and blocked for seconds of nfsd teardown. A full service
+        restart remains the fallback when the re-export reports an error
+        """
 
         def __init__(self,
                      logger: logging.Logger) -> None:
             self.logger: logging.Logger = logger
 
         def __enter__(self):
-            self.logger.debug(f'\tStopping the NFS Server service')
-            output, err_code = run_command('service nfs-kernel-server stop')
-            if err_code:
-                raise RuntimeError(f'Failed to stop "nfs-kernel-server" service. Output: {output}')
-
-            self.logger.debug(f'\tOK')
             return self
 
         def __exit__(self, exc_type, exc_val, exc_tb) -> None:
-            self.logger.debug(f'\tStarting the NFS Server service')
-            output, err_code = run_command('service nfs-kernel-server start')
+            self.logger.debug(f'\tRe-exporting the NFS filesystems')
+            output, err_code = run_command('exportfs -ra')
             if err_code:
-                raise RuntimeError(f'Failed to start "nfs-kernel-server" service. Output: {output}')
+                self.logger.warning(f'"exportfs -ra" failed ({output}) - restarting the NFS service')
+                output, err_code = run_command('service nfs-kernel-server restart')
+                if err_code:
+                    raise RuntimeError(f'Failed to restart "nfs-kernel-server" service. Output: {output}')
             self.logger.debug(f'\tOK')
 
     @staticmethod
-    def copy_partition(src_dir: str, dst_dir: str) -> bool:
+    def copy_file(src: str, dst: str) -> str:
+        """
+        Copies the file data in-kernel: 'os.copy_file_range' transfers page cache to page
+        cache without the user-space read/write round-trip, 'os.sendfile' is the fallback
+        for filesystems that do not support it (e.g. the loop mount -> NFS export case).
+        Mode/timestamps (and ownership, when running as root) are preserved to keep the
+        'cp -a' semantics
+
+        :return: the destination path (the 'shutil.copytree' copy_function contract)
+        """
+
+        # copytree routes every non-dir/non-symlink entry through here, and a rootfs
+        # partition contains more than regular files: opening a FIFO blocks forever,
+        # a unix socket raises ENXIO, and draining a device node would degrade it to
+        # an empty regular file - so dispatch on the file type before opening anything
+        src_stat: os.stat_result = os.lstat(src)
+        file_type: int = stat.S_IFMT(src_stat.st_mode)
+        if stat.S_IFREG != file_type:
+            if file_type in (stat.S_IFIFO, stat.S_IFCHR, stat.S_IFBLK):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(dst)
+                os.mknod(dst, src_stat.st_mode, src_stat.st_rdev)
+                shutil.copystat(src, dst)
+                with contextlib.suppress(OSError):
+                    os.chown(dst, src_stat.st_uid, src_stat.st_gid)
+            # Unix sockets are live endpoints, not data - nothing to recreate
+            return dst
+
+        in_fd: int = os.open(src, os.O_RDONLY)
+        try:
+            out_fd: int = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                # Both sides are strictly sequential: the hint widens the kernel
+                # readahead window beyond its conservative default
+                with contextlib.suppress(OSError):
+                    os.posix_fadvise(in_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                    os.posix_fadvise(out_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+                size: int = os.fstat(in_fd).st_size
+                remaining: int = size
+                try:
+                    while remaining > 0:
+                        copied: int = os.copy_file_range(in_fd, out_fd, remaining)
+                        if not copied:
+                            break
+                        remaining -= copied
+                except OSError as exc:
+                    if exc.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL):
+                        raise
+
+                    os.lseek(in_fd, 0, os.SEEK_SET)
+                    os.ftruncate(out_fd, 0)
+
+                    # Large cross-device copies read through an eagerly populated
+                    # mapping - the kernel prefetches the whole source without a
+                    # read(2) per buffer; smaller files stay on the sendfile path
+                    if (size < ImageWrapper.MMAP_COPY_MIN_SIZE
+                            or not ImageWrapper._copy_mmap(in_fd, out_fd, size)):
+                        os.lseek(in_fd, 0, os.SEEK_SET)
+                        os.ftruncate(out_fd, 0)
+                        offset: int = 0
+                        while offset < size:
+                            sent: int = os.sendfile(out_fd, in_fd, offset, size - offset)
+                            if not sent:
+                                break
+                            offset += sent
+
+                # The copied data will not be re-read on this side - let the kernel
+                # reclaim the pages instead of polluting the cache with every image byte
+                with contextlib.suppress(OSError):
+                    os.posix_fadvise(out_fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(out_fd)
+        finally:
+            os.close(in_fd)
+
+        shutil.copystat(src, dst)
+        with contextlib.suppress(OSError):
+            os.chown(dst, src_stat.st_uid, src_stat.st_gid)
+
+        return dst
+
+    @staticmethod
+    def _copy_mmap(in_fd: int, out_fd: int, size: int) -> bool:
+        """
+        Writes the whole source through a read-only MAP_POPULATE mapping: one mmap
+        plus large write(2)s instead of a read/write pair per buffer, and the
+        populated mapping lets the kernel prefetch the file ahead of the writes.
+        Best-effort - the caller falls back to sendfile on False
+        """
+        flags: int = mmap.MAP_PRIVATE | getattr(mmap, 'MAP_POPULATE', 0)
+        try:
+            with mmap.mmap(in_fd, size, prot=mmap.PROT_READ, flags=flags) as source:
+                view: memoryview = memoryview(source)
+                try:
+                    offset: int = 0
+                    while offset < size:
+                        offset += os.write(out_fd, view[offset:])
+                finally:
+                    view.release()
+                with contextlib.suppress(OSError, ValueError):
+                    source.madvise(mmap.MADV_DONTNEED)
+            return True
+        except (OSError, ValueError, BufferError):
+            return False
+
+    @staticmethod
+    def copy_tree_parallel(src_dir: str,
+                           dst_dir: str,
+                           max_workers: int = None) -> bool:
+        """
+        Copies the whole directory tree, fanning the independent top-level subtrees out
+        to a thread pool
+
+        'cp -ar' walks and copies everything serially (plus a fork+exec per call); the
+        typical rootfs partition is thousands of small files, so the parallel per-subtree
+        copy is what dominates the unpack time
+
+        :param src_dir: source directory (a mounted image partition)
+        :param dst_dir: destination directory (the per-CSL NFS export)
+        :param max_workers: thread pool size, defaults to the CPU count
+
+        :return: True or False
+        """
+
         # Trying to create directory, ignore is its already exits
         Path(dst_dir).mkdir(parents=True, exist_ok=True)
 
-        # Copy all files to the destination directory:
-        cmd: str = f'cp -ar {src_dir}/. {dst_dir}'
-        _, err_code = run_command(cmd)
-        if err_code:
-            sys.stderr.write(f'"{cmd}" failed')
+        with os.scandir(src_dir) as entries:
+            top_level: List[os.DirEntry] = list(entries)
+
+        def copy_entry(entry: os.DirEntry) -> bool:
+            dst_path: str = os.path.join(dst_dir, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.copytree(entry.path, dst_path,
+                                    symlinks=True,
+                                    copy_function=ImageWrapper.copy_file,
+                                    dirs_exist_ok=True)
+                elif entry.is_symlink():
+                    shutil.copy2(entry.path, dst_path, follow_symlinks=False)
+                else:
+                    ImageWrapper.copy_file(entry.path, dst_path)
+                return True
+            except (OSError, shutil.Error) as exc:
+                sys.stderr.write(f'Failed to copy {entry.path} ---> {dst_path}: {exc}')
+                return False
+
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            return all(executor.map(copy_entry, top_level))
+
+    @staticmethod
+    def copy_partition(src_dir: str, dst_dir: str) -> bool:
+        return ImageWrapper.copy_tree_parallel(src_dir, dst_dir)
+
+    def _image_mount_key(self) -> Optional[List]:
+        # Same identity signals as the prepare state: the resolved symlink target
+        # plus its mtime, so a re-pointed or re-downloaded image gets a new key
+        try:
+            return [os.path.realpath(self.img_path), os.stat(self.img_path).st_mtime_ns]
+        except OSError:
+            return None
+
+    def _unmount_image_partitions(self,
+                                  boot_mount: str,
+                                  root_mount: str,
+                                  mounted_key: Optional[List]) -> None:
+        for mount_point in (boot_mount, root_mount):
+            run_command(f'umount {mount_point}', print_output=False)
+
+        # Detach the loop devices still backed by the previously mounted image file
+        if mounted_key:
+            output, _ = run_command(f'losetup -j {mounted_key[0]}', print_output=False)
+            for line in output.splitlines():
+                run_command(f"losetup -d {line.split(':')[0]}", print_output=False)
+
+    def mount_image_partitions(self,
+                               boot_mount: str,
+                               root_mount: str) -> bool:
+        """
+        Attaches the image to a loop device and mounts both partitions read-only at the
+        given mountpoints; existing mounts are reused only while they still belong to
+        the current image (a marker next to the mountpoints records what is mounted),
+        otherwise the stale mounts and their loop device are dropped and the new image
+        is mounted. The loop device stays attached for as long as the partitions are
+        mounted
+        """
+        marker: Path = Path(boot_mount).parent / self.IMAGE_MOUNT_MARKER_NAME
+        mount_key: Optional[List] = self._image_mount_key()
+
+        if os.path.ismount(boot_mount) and os.path.ismount(root_mount):
+            try:
+                mounted_key: Optional[List] = json.loads(marker.read_text())
+            except (OSError, json.JSONDecodeError):
+                mounted_key = None
+
+            if mount_key is not None and mounted_key == mount_key:
+                return True
+
+            # The mounts persist across deploys, so after the image symlink is
+            # re-pointed they still serve the previous build - remount the new one
+            self.logger.debug(f'\tMounted image at {boot_mount} is stale - remounting')
+            with contextlib.suppress(OSError):
+                marker.unlink()
+            self._unmount_image_partitions(boot_mount, root_mount, mounted_key)
+
+        for mount_point in (boot_mount, root_mount):
+            Path(mount_point).mkdir(parents=True, exist_ok=True)
+
+        output, _ = run_command(f'losetup --show -fP {self.img_path}', print_output=False)
+        if not output:
+            self.logger.error(f'Failed to create loop devices for {self.img_path}')
+            return False
+        loop: str = output.split()[0]
+
+        for partition, mount_point in ((f'{loop}p1', boot_mount), (f'{loop}p2', root_mount)):
+            output, status = run_command(f'mount -o ro,noatime {partition} {mount_point}',
+                                         print_output=False)
+            if 0 != status:
+                self.logger.error(f'Failed to mount {partition} to {mount_point}: {output}')
+                return False
+
+        with contextlib.suppress(OSError):
+            marker.write_text(json.dumps(mount_key))
+
+        return True
+
+    def expose_partitions_overlay(self,
+                                  boot_dir: str,
+                                  root_dir: str) -> bool:
+        """
+        Zero-copy alternative to the copy-based unpack: the image partitions are mounted
+        read-only once under {pxe_fs_root}/.image and each CSL directory becomes an
+        overlayfs with that shared lower layer, so the per-CSL config edits land in a
+        small upper dir instead of a full duplicate of every partition byte
+        """
+        base_dir: str = f'{self.pxe_fs_root}/{self.IMAGE_MOUNT_DIR_NAME}'
+        lower_boot: str = f'{base_dir}/{self.BOOT_FS_DIR_NAME}'
+        lower_root: str = f'{base_dir}/{self.ROOT_FS_DIR_NAME}'
+
+        if not self.mount_image_partitions(lower_boot, lower_root):
             return False
 
+        for lower_dir, dst_dir in ((lower_boot, boot_dir), (lower_root, root_dir)):
+            # Drop a stale overlay from the previous deploy, if any
+            run_command(f'umount {dst_dir}', print_output=False)
+
+            upper_dir, work_dir = f'{dst_dir}.upper', f'{dst_dir}.work'
+            for folder in (dst_dir, upper_dir, work_dir):
+                Path(folder).mkdir(parents=True, exist_ok=True)
+
+            # nfs_export=on (which requires index=on) is mandatory here: the overlay
+            # is re-exported by knfsd as the CSL NFS root, and without it the kernel
+            # cannot decode the file handles the clients present - the mount would
+            # look fine on the server and fail only on the booting CSLs
+            cmd: str = (f'mount -t overlay overlay '
+                        f'-o lowerdir={lower_dir},upperdir={upper_dir},workdir={work_dir},'
+                        f'index=on,nfs_export=on {dst_dir}')
+            output, status = run_command(cmd, print_output=False)
+            if 0 != status:
+                self.logger.error(f'Failed to mount an NFS-exportable overlay on {dst_dir} '
+                                  f'(the kernel must support overlayfs nfs_export=on): {output}')
+                return False
+
         return True
 
     def unpack_image(self,
@@ -158,17 +489,23 @@ class ImageWrapper(object):
         """
 
         self.logger.debug(f'\tUnpacking the SDCard image {self.img_path.absolute()}')
-        if not self.img_path.exists() or not self.img_path.is_file():
+        # A single stat answers both the existence and the regular-file checks
+        try:
+            image_stat: os.stat_result = self.img_path.stat()
+        except OSError as exc:
+            raise RuntimeError(f'Image file {self.img_path.absolute()} do not exists') from exc
+        if not stat.S_ISREG(image_stat.st_mode):
             raise RuntimeError(f'Image file {self.img_path.absolute()} do not exists')
 
+        if self.config.pxe_server.use_bind_mount:
+            with self.NFSServiceContext(self.logger) as _:
+                return self.expose_partitions_overlay(boot_dir, root_dir)
+
         with self.NFSServiceContext(self.logger) as _:
 
             csl_root: str = str(Path(boot_dir).parent)
             self.logger.debug(f'\tRemove the old {csl_root}')
-            _, err_code = run_command(f'rm -rf {csl_root}')
-            if err_code:
-                self.logger.error(f'Failed to remove dir: {csl_root}')
-                return False
+            shutil.rmtree(csl_root, ignore_errors=True)
 
             with tempfile.TemporaryDirectory() as tmp_dir:
                 with self.LoopContext(str(self.img_path), self.logger) as loop:
@@ -183,30 +520,31 @@ class ImageWrapper(object):
     @staticmethod
     def create_tftp_boot_symlink(boot_dir: str,
                                  csl_tftp_boot_dir: str) -> bool:
-        cmd: str = f'ln -fsn {boot_dir}/ {csl_tftp_boot_dir}'
-        _, err_code = run_command(cmd, print_output=False)
-        if err_code:
-            sys.stderr.write(f'"{cmd}" failed')
+        # Direct syscalls instead of forking 'ln -fsn': replace-if-exists semantics
+        try:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(csl_tftp_boot_dir)
+            os.symlink(f'{boot_dir}/', csl_tftp_boot_dir)
+        except OSError as exc:
+            sys.stderr.write(f'Failed to create symlink {csl_tftp_boot_dir} --> {boot_dir}: {exc}')
             return False
 
         return True
 
     def configure_csl_filesystem(self,
-                                 boot_dir: str,
-                                 root_dir: str,
+                                 paths: _CSLPaths,
                                  server_ip_address: str,
                                  csl_ip_addr: str,
                                  csl_hostname: str) -> None:
+        # The trees may be hardlink clones of the template - give the edited files
+        # their own inodes so the edits stay private to this CSL
+        for file_path in (paths.ssh_config, paths.fstab, paths.hostname, paths.cmdline):
+            ImageWrapper.break_hardlink(file_path)
 
-        ssh_config_path: str = f'{root_dir}{ImageWrapper.SSHD_CONFIG_PATH}'
-        fstab_path: str = f'{root_dir}{ImageWrapper.FSTAB_CONFIG_PATH}'
-        hostname_file_path: str = f'{root_dir}/{ImageWrapper.HOSTNAME_FILE_PATH}'
-        cmdline_path: str = f'{boot_dir}/{ImageWrapper.CMDLINE_FINE_NAME}'
-
-        self.modify_sshd_config(ssh_config_path)
-        self.modify_fstab_file(boot_dir, fstab_path, server_ip_address)
-        self.modify_cmdline_file(root_dir, cmdline_path, server_ip_address)
-        self.set_cls_hostname(hostname_file_path, csl_hostname)
+        self.modify_sshd_config(paths.ssh_config)
+        self.modify_fstab_file(paths.boot_dir, paths.fstab, server_ip_address)
+        self.modify_cmdline_file(paths.root_dir, paths.cmdline, server_ip_address)
+        self.set_cls_hostname(paths.hostname, csl_hostname)
 
         # FIXME
         # ImageWrapper.add_host_on_server(csl_ip_addr, csl_hostname)
@@ -216,63 +554,66 @@ class ImageWrapper(object):
                           fstab_path: str,
                           ip_address: str) -> bool:
         self.logger.debug(f'\tConfiguring the CSL fstab config: File path: {fstab_path}')
-        lines: List[str] = FileUtilities.read_file_lines(fstab_path)
-        if not lines:
+        try:
+            data: bytes = Path(fstab_path).read_bytes()
+        except OSError:
             return False
 
-        root_idx: int = -1
-        for idx, line in enumerate(lines):
-            params: List[str] = line.split()
-            if len(params) > 1 and '/' == params[1]:
-                root_idx = idx
-                break
-
-        if -1 == root_idx:
+        replacement: bytes = f'{ip_address}:{boot_dir} /boot nfs defaults,vers=4.1,tcp 0 0'.encode()
+        data, replaced = _FSTAB_ROOT_RE.subn(replacement, data, count=1)
+        if not replaced:
             return False
 
-        lines[root_idx] = f'{ip_address}:{boot_dir} /boot nfs defaults,vers=4.1,tcp 0 0'
-        FileUtilities.write_lines_to_file(fstab_path, lines)
+        Path(fstab_path).write_bytes(data)
         return True
 
     def modify_sshd_config(self, ssh_config_path: str) -> bool:
-        lines: List[str] = FileUtilities.read_file_lines(ssh_config_path)
-        if not lines:
+        try:
+            data: bytes = Path(ssh_config_path).read_bytes()
+        except OSError:
+            return False
+        if not data:
             return False
 
-        # TODO: Fix me check if it could be more names with 'PasswordAuthentication' and etc
-        replacements: List[Tuple[str, str]] = [
-            ('PermitRootLogin', 'PermitRootLogin yes'),
-            ('PasswordAuthentication', 'PasswordAuthentication yes'),
-            ('/etc/ssh/ssh_host_rsa_key', 'HostKey /etc/ssh/ssh_host_rsa_key')
-        ]
-        for idx, line in enumerate(lines):
-            for substr, new_value in replacements:
-                if substr in line:
-                    lines[idx] = new_value
+        for pattern, replacement in _SSHD_PATTERNS:
+            data = pattern.sub(replacement, data)
 
         self.logger.debug(f'\tConfiguring the CSL sshd config: File path: {ssh_config_path}')
-        FileUtilities.write_lines_to_file(ssh_config_path, lines)
+        Path(ssh_config_path).write_bytes(data)
         return True
 
     @staticmethod
     def add_host_on_server(ip: str, hostname: str):
+        """
+        Registers (or updates) the host in /etc/hosts in a single pass: comments and
+        blank lines are kept in place, entries for the IP are collapsed to one line
+        and the whole file is written back once
+        """
         lines: List[str] = FileUtilities.read_file_lines(ImageWrapper.HOSTS_FILE_PATH)
-        has_to_add_new: bool = True
-        for idx, line in enumerate(lines):
+
+        output: List[str] = []
+        replaced: bool = False
+        for line in lines:
+            stripped: str = line.strip()
             # Keep empty lines and comments
-            if len(line) and not line.startswith('#'):
-                print(line)
-                host_ip, name = line.split(sep=' ', maxsplit=1)
-                host_ip, name = host_ip.strip(), name.strip()
-                if host_ip == ip and name == hostname:
-                    return
-                elif host_ip == ip and name != hostname:
-                    lines[idx] = line.replace(name, hostname)
-                    has_to_add_new = False
-
-        if has_to_add_new:
-            lines.append(f"{ip:<18}{hostname}")
-        FileUtilities.write_lines_to_file(ImageWrapper.HOSTS_FILE_PATH, lines)
+            if not stripped or stripped.startswith('#'):
+                output.append(line)
+                continue
+
+            host_ip, _, name = stripped.partition(' ')
+            if host_ip == ip:
+                # The first matching entry is rewritten, any duplicates are dropped
+                if not replaced:
+                    output.append(f'{ip:<18}{hostname}')
+                    replaced = True
+                continue
+
+            output.append(line)
+
+        if not replaced:
+            output.append(f'{ip:<18}{hostname}')
+
+        FileUtilities.write_lines_to_file(ImageWrapper.HOSTS_FILE_PATH, output)
 
     def set_cls_hostname(self,
                          hostname_file_path: str,
@@ -284,8 +625,7 @@ class ImageWrapper(object):
                             root_dir: str,
                             cmdline_path: str,
                             ip_address: str) -> bool:
-        cmdline: str = (f'rootwait console=tty1 console=ttyS0,115200 pcie_aspm=off selinux=1 enforcing=0 '
-                        f'ip=dhcp root=/dev/nfs nfsroot={ip_address}:{root_dir},vers=4.1,proto=tcp')
+        cmdline: str = ImageWrapper.CMDLINE_TEMPLATE.format(ip=ip_address, root=root_dir)
 
         self.logger.debug(f'\tUpdating the cmdfile {cmdline_path} to "{cmdline}"')
         FileUtilities.write_lines_to_file(cmdline_path, [cmdline])
@@ -296,44 +636,265 @@ class ImageWrapper(object):
         deployment_dir: str = os.path.dirname(os.path.realpath(__file__))
         ssh_keys_dir: str = f'{deployment_dir}/ssh_keys'
 
-        for key_file, mode in [('ssh_host_rsa_key.pub', 664), ('ssh_host_rsa_key', 600)]:
-            run_command(f'cp {ssh_keys_dir}/{key_file} {root_dir}/etc/ssh/{key_file}')
-            run_command(f'chmod {mode} {root_dir}/etc/ssh/{key_file}')
+        for key_file, mode in [('ssh_host_rsa_key.pub', 0o664), ('ssh_host_rsa_key', 0o600)]:
+            dst_path: str = f'{root_dir}/etc/ssh/{key_file}'
+            shutil.copy2(f'{ssh_keys_dir}/{key_file}', dst_path)
+            os.chmod(dst_path, mode)
+
+    @property
+    def prepare_state_path(self) -> Path:
+        return Path(self.config.pxe_server.artifacts_dir) / self.PREPARE_STATE_FILE_NAME
+
+    def current_prepare_key(self,
+                            hostname: str) -> Optional[List]:
+        # The key identifies the exact image content prepared for the node: the resolved
+        # symlink target plus its mtime, so a re-pointed or re-downloaded image invalidates it
+        try:
+            return [os.path.realpath(self.img_path), os.stat(self.img_path).st_mtime_ns, hostname]
+        except OSError:
+            return None
+
+    def load_prepare_state(self) -> Dict:
+        try:
+            with open(self.prepare_state_path, 'rt') as state_file:
+                return json.load(state_file)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def store_prepare_state(self,
+                            hostname: str,
+                            prepare_key: List) -> None:
+        with self._state_lock:
+            state: Dict = self.load_prepare_state()
+            state[hostname] = prepare_key
+            tmp_path: str = f'{self.prepare_state_path}.tmp'
+            try:
+                with open(tmp_path, 'wt') as state_file:
+                    json.dump(state, state_file)
+                os.replace(tmp_path, self.prepare_state_path)
+            except OSError:
+                # State is an optimization only - next deploy just prepares unconditionally
+                pass
+
+    def csl_paths(self, node: CSLNode) -> _CSLPaths:
+        return _CSLPaths.for_node(self.pxe_fs_root, node)
+
+    def _prepared_tree_present(self, paths: _CSLPaths) -> bool:
+        for tree in (paths.boot_dir, paths.root_dir):
+            try:
+                if not os.listdir(tree):
+                    return False
+            except OSError:
+                return False
 
-    def prepare_pxe_boot_configuration(self,
-                                       node: CSLNode) -> bool:
-        mac_address, ip_address, hostname = node.mac_address, node.ip_address, node.hostname
-        self.logger.debug(f'Preparing NFS filesystem for device '
-                          f'MAC: {mac_address}, IP: {ip_address}, Hostname: {hostname}')
+            # In overlay mode a populated directory is not enough: after a server
+            # reboot the overlay mounts are gone and only the empty upper/mountpoint
+            # dirs remain, so the tree must actually be a mountpoint
+            if self.config.pxe_server.use_bind_mount and not os.path.ismount(tree):
+                return False
+
+        return True
+
+    def node_needs_prepare(self, node: CSLNode) -> bool:
+        prepare_key: Optional[List] = self.current_prepare_key(node.hostname)
+        if not prepare_key or self.load_prepare_state().get(node.hostname) != prepare_key:
+            return True
+
+        # The state file lives in artifacts_dir and outlives the trees it describes
+        # (a wiped pxe_fs_root, a reboot dropping every overlay mount) - honor it
+        # only while the prepared trees are actually in place
+        if not self._prepared_tree_present(self.csl_paths(node)):
+            self.logger.debug(f'\tPrepare state for {node.hostname} is current but the '
+                              f'prepared tree is missing - re-preparing')
+            return True
+
+        self.logger.debug(f'\tNFS filesystem for {node.hostname} is already prepared '
+                          f'from this image - skipping')
+        return False
 
-        # If the 'nfs_folder_name' attribute is specified then it will be used as the NFS filesystem
-        # folder for the CommsSleeve, otherwise name will be generated automatically from the node's MAC
-        # address just by removing the ':' symbols from it
-        nfs_dir_name: str = node.nfs_folder_name if node.nfs_folder_name else mac_address.replace(':', '')
+    def configure_prepared_node(self,
+                                node: CSLNode,
+                                paths: _CSLPaths) -> bool:
+        """
+        Post-unpack, per-node part of the preparation: applies the node-specific config
+        edits, publishes the TFTP symlink and records the prepare state
+        """
+        self.configure_csl_filesystem(paths,
+                                      self.server_ip_address, node.ip_address, node.hostname)
+
+        self.logger.debug(f'\tCreating Symlink {paths.tftp_symlink} --> {paths.boot_dir}')
+        if not self.create_tftp_boot_symlink(paths.boot_dir, paths.tftp_symlink):
+            return False
 
-        csl_root_folder = f'{self.pxe_fs_root}/{nfs_dir_name}'
+        # self.copy_ssh_keys(paths.root_dir)
 
-        boot_dir: str = f'{csl_root_folder}/{self.BOOT_FS_DIR_NAME}'
-        self.logger.debug(f'\tCSL NSF Boot dir: {boot_dir}')
+        prepare_key: Optional[List] = self.current_prepare_key(node.hostname)
+        if prepare_key:
+            self.store_prepare_state(node.hostname, prepare_key)
 
-        root_dir: str = f'{csl_root_folder}/{self.ROOT_FS_DIR_NAME}'
-        self.logger.debug(f'\tCSL NSF Root dir: {root_dir}')
+        return True
 
-        tftp_root_dir: str = f'{self.pxe_fs_root}/{self.TFTP_ROOT_DIR_NAME}'
-        csl_tftp_boot_dir_name: str = mac_address.replace(':', '-')
-        csl_tftp_boot_dir: str = f'{tftp_root_dir}/{csl_tftp_boot_dir_name}'
+    def materialize_template(self) -> Optional[Tuple[str, str]]:
+        """
+        Unpacks the image exactly once into a canonical template under
+        {pxe_fs_root}/.templates/<image_key>/{boot,rootfs} and reuses it until the
+        image content changes (the key is derived from the resolved image path and
+        its mtime, same signals as the prepare state). Per-CSL trees are then cloned
+        from the template in O(metadata) instead of re-copying every partition byte
 
-        self.logger.debug(f'\tCSL TFTP Boot dir: {csl_tftp_boot_dir}')
+        :return: (template_boot_dir, template_root_dir) or None on failure
+        """
+        try:
+            mtime: int = os.stat(self.img_path).st_mtime_ns
+        except OSError:
+            self.logger.error(f'Image file {self.img_path.absolute()} do not exists')
+            return None
+
+        image_key: str = hashlib.sha1(f'{os.path.realpath(self.img_path)}:{mtime}'
+                                      .encode()).hexdigest()[:16]
+        templates_root: str = f'{self.pxe_fs_root}/{self.TEMPLATES_DIR_NAME}'
+        template_dir: str = f'{templates_root}/{image_key}'
+
+        boot_dir: str = f'{template_dir}/{self.BOOT_FS_DIR_NAME}'
+        root_dir: str = f'{template_dir}/{self.ROOT_FS_DIR_NAME}'
+        marker: Path = Path(template_dir) / self.TEMPLATE_COMPLETE_MARKER
+
+        if marker.exists():
+            self.logger.debug(f'\tReusing the unpacked image template {template_dir}')
+            return boot_dir, root_dir
+
+        # Only the current image is ever cloned from, so templates of the previous
+        # images are dropped to keep the disk usage bounded
+        with contextlib.suppress(OSError):
+            with os.scandir(templates_root) as entries:
+                for entry in entries:
+                    shutil.rmtree(entry.path, ignore_errors=True)
 
         if not self.unpack_image(boot_dir, root_dir):
+            return None
+
+        marker.touch()
+        return boot_dir, root_dir
+
+    def clone_tree(self, src_dir: str, dst_dir: str) -> bool:
+        """
+        Clones the template tree in O(metadata): reflinks share the data blocks on the
+        filesystems that support them (btrfs/xfs), a hardlink farm is the fallback -
+        either way no partition byte is duplicated
+        """
+        Path(dst_dir).parent.mkdir(parents=True, exist_ok=True)
+
+        _, status = run_command(f'cp -a --reflink=always {src_dir} {dst_dir}', print_output=False)
+        if 0 != status:
+            # A failed reflink attempt (ext4/overlayfs) exits non-zero but leaves
+            # dst_dir populated with the directory skeleton and zero-byte files;
+            # without this cleanup 'cp -al' would see the existing directory and
+            # nest the hardlink farm at dst_dir/<src name> while exiting 0
+            shutil.rmtree(dst_dir, ignore_errors=True)
+            _, status = run_command(f'cp -al {src_dir} {dst_dir}', print_output=False)
+
+        try:
+            populated: bool = bool(os.listdir(dst_dir))
+        except OSError:
+            populated = False
+
+        if 0 != status or not populated:
+            self.logger.error(f'Failed to clone {src_dir} ---> {dst_dir}')
             return False
-        self.configure_csl_filesystem(boot_dir, root_dir,
-                                      self.server_ip_address, ip_address, hostname)
+        return True
+
+    @staticmethod
+    def break_hardlink(file_path: str) -> None:
+        """
+        In-place edits on a hardlink-cloned tree would write through the shared template
+        inode; files with a link count above one are re-materialized as private copies
+        first (reflink clones already own their inode and are left alone)
+        """
+        with contextlib.suppress(OSError):
+            if os.stat(file_path).st_nlink > 1:
+                tmp_path: str = f'{file_path}.tmp'
+                shutil.copy2(file_path, tmp_path)
+                os.replace(tmp_path, file_path)
+
+    def prepare_many(self,
+                     nodes: List[CSLNode]) -> bool:
+        return self.prepare_all(nodes, max_workers=1)
+
+    def prepare_all(self,
+                    nodes: List[CSLNode],
+                    max_workers: int = None) -> bool:
+        """
+        Prepares the NFS filesystems for all the nodes from a single image setup: the
+        image is unpacked once into the canonical template (one loop attach, one pair
+        of mounts, one NFS restart) and every pending node is cloned from it, so N
+        nodes cost O(1) image unpacks instead of O(N)
+
+        The per-node clones and config edits are independent and metadata-light, so
+        they fan out to a thread pool. Only the single-threaded template unpack ever
+        enters the Loop/Mount contexts, never the workers
 
-        self.logger.debug(f'\tCreating Symlink {csl_tftp_boot_dir} --> {boot_dir}')
-        if not self.create_tftp_boot_symlink(boot_dir, csl_tftp_boot_dir):
+        :param nodes: CSL nodes to prepare (all booting from self.img_path)
+        :param max_workers: thread pool size, defaults to min(len(nodes), 2 * CPU count)
+        :return: True or False
+        """
+        pending: List[CSLNode] = [node for node in nodes if self.node_needs_prepare(node)]
+        if not pending:
+            return True
+
+        if self.config.pxe_server.use_bind_mount:
+            # The overlay path already shares one loop device and one read-only lower
+            # mount across all the nodes, so the per-node prepare is O(1) by itself;
+            # it restarts the NFS service per node, which keeps it serial
+            return all([self.prepare_node_overlay(node) for node in pending])
+
+        template: Optional[Tuple[str, str]] = self.materialize_template()
+        if template is None:
             return False
+        template_boot, template_root = template
 
-        # self.copy_ssh_keys(root_dir)
+        workers: int = max_workers or min(len(pending), (os.cpu_count() or 1) * 2)
+        with self.NFSServiceContext(self.logger) as _:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results: List[bool] = list(executor.map(
+                    lambda node: self.clone_node_from_template(node, template_boot, template_root),
+                    pending))
+        return all(results)
+
+    def prepare_node_overlay(self,
+                             node: CSLNode) -> bool:
+        self.logger.debug(f'Preparing NFS filesystem for device '
+                          f'MAC: {node.mac_address}, IP: {node.ip_address}, Hostname: {node.hostname}')
 
-        return False
+        paths: _CSLPaths = self.csl_paths(node)
+        if not self.unpack_image(paths.boot_dir, paths.root_dir):
+            return False
+
+        return self.configure_prepared_node(node, paths)
+
+    def clone_node_from_template(self,
+                                 node: CSLNode,
+                                 template_boot: str,
+                                 template_root: str) -> bool:
+        """
+        Prepares a single node by cloning the already materialized template
+        (prepare_many owns the template and the NFS service lifecycle)
+        """
+        self.logger.debug(f'Preparing NFS filesystem for device '
+                          f'MAC: {node.mac_address}, IP: {node.ip_address}, Hostname: {node.hostname}')
+
+        paths: _CSLPaths = self.csl_paths(node)
+
+        csl_root: str = str(Path(paths.boot_dir).parent)
+        self.logger.debug(f'\tRemove the old {csl_root}')
+        shutil.rmtree(csl_root, ignore_errors=True)
+
+        if not self.clone_tree(template_boot, paths.boot_dir):
+            return False
+        if not self.clone_tree(template_root, paths.root_dir):
+            return False
+
+        return self.configure_prepared_node(node, paths)
+
+    def prepare_pxe_boot_configuration(self,
+                                       node: CSLNode) -> bool:
+        return self.prepare_many([node])
@@ -0,0 +1,92 @@
+import contextlib
+import logging
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Tuple
+
+from config.Configuration import Configuration, JFrog, PXEServerConfig
+from deployment.Deployment import Deployment
+from integration.Artifactory import Artifactory
+from logger.Logger import init_logger
+from utils.Utilities import find_latest_artifact_dir
+
+
+class PxeDeployBase(object):
+    """
+    Shared plumbing for the deployment entry points (PxeDeployer and Scheduler):
+    configuration access, the Artifactory client with its connection pool,
+    artifact download helpers and node deployment
+    """
+
+    ARTIFACT_FOLDER_FORMAT: str = '%Y_%m_%d_%H_%M_%S'
+
+    def __init__(self):
+        self.config: Configuration = Configuration.get_configuration()
+        self.logger: logging.Logger = init_logger()
+        self.deployer: Deployment = Deployment()
+
+        self.jfrog_config: JFrog = self.config.jfrog
+        self.pxe_server_config: PXEServerConfig = self.config.pxe_server
+
+        try:
+            self.pxe_server_config.artifacts_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as _:
+            raise RuntimeError(f'Failed to create/access an Artifacts folder {self.pxe_server_config.artifacts_dir}')
+
+        self.artifactory: Artifactory = Artifactory(host=self.jfrog_config.host,
+                                                    username=self.jfrog_config.username,
+                                                    password=self.jfrog_config.password)
+
+    def get_latest_local_image(self) -> Tuple[datetime, Path]:
+        return find_latest_artifact_dir(self.pxe_server_config.artifacts_dir, self.ARTIFACT_FOLDER_FORMAT)
+
+    def download_jfrog_file(self,
+                            remote_path: str,
+                            local_dst_path) -> bool:
+        # Lazy %-formatting: the strings are only built when the DEBUG level is enabled
+        self.logger.debug('Downloading %s ---> %s', remote_path, local_dst_path)
+        ok, msg, bytes_downloaded = self.artifactory.download_artifact(f'{remote_path}', f'{local_dst_path}')
+        if not ok:
+            self.logger.error('Download failed: %s', msg)
+            return False
+
+        self.logger.debug('OK. %d bytes downloaded', bytes_downloaded)
+        return True
+
+    def download_artifacts(self,
+                           latest_build_date: datetime,
+                           remote_build_folder: str) -> bool:
+        folder_name: str = latest_build_date.strftime(self.ARTIFACT_FOLDER_FORMAT)
+        folder_path: Path = self.pxe_server_config.artifacts_dir / folder_name
+
+        changes_file, image_file_name = 'ChangeSet.txt', Artifactory.IMAGE_FILE_NAME
+        folder_path.mkdir(parents=True, exist_ok=False)
+
+        # The artifacts are independent, so download them concurrently instead of letting
+        # the small file's latency delay the big image transfer
+        files: Tuple[str, ...] = (changes_file, image_file_name)
+        with ThreadPoolExecutor(max_workers=len(files)) as executor:
+            futures = [executor.submit(self.download_jfrog_file,
+                                       f'{remote_build_folder}/{file_name}',
+                                       folder_path / file_name) for file_name in files]
+            if not all(future.result() for future in futures):
+                return False
+
+        # Re-point the 'latest image' symlink with direct syscalls instead of forking /bin/ln
+        link: Path = self.pxe_server_config.sdcard_image_path
+        target: Path = folder_path / image_file_name
+        try:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(link)
+            os.symlink(target, link)
+        except OSError as exc:
+            self.logger.error(f'Failed to create symlink {link} ---> {target}: {exc}')
+            return False
+
+        return True
+
+    def deploy_nodes(self) -> bool:
+        return self.deployer.deploy(nodes=self.config.csl_nodes)
@@ -1,10 +1,19 @@
+from __future__ import annotations
+
+import contextlib
 import datetime
+import json
+import os
 import requests
+import shutil
 import urllib.parse
 
+from concurrent.futures import ThreadPoolExecutor
 from requests import Response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from http import HTTPStatus
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 
 
 class Artifactory(object):
@@ -13,6 +22,11 @@ class Artifactory(object):
     ARCH_FLAVOR: str = 'cm4io_nfs'
     IMAGE_FILE_NAME: str = 'sdcard.img'
     UPDATED_ATTR_FORMAT: str = '%Y-%m-%dT%H:%M:%S'
+    DOWNLOAD_BUFFER_SIZE: int = 1024 * 1024
+    DOWNLOAD_MAX_ATTEMPTS: int = 3
+    DOWNLOAD_RANGE_WORKERS: int = 6
+    # Below this size the extra connections cost more than the parallelism buys
+    DOWNLOAD_PARALLEL_MIN_SIZE: int = 64 * 1024 * 1024
 
     def __init__(self,
                  host: str, username: str, password: str):
@@ -22,82 +36,234 @@ class Artifactory(object):
         self.password: str = password
         self.api_url: str = f'{self.host}/api/search/aql'
 
+        # One pooled session shared by all the requests: keeps the TCP+TLS connections alive
+        # between the API calls/downloads instead of a new handshake per request
+        self.session: requests.Session = requests.Session()
+        self.session.auth = (self.username, self.password)
+        adapter: HTTPAdapter = HTTPAdapter(pool_connections=4,
+                                           pool_maxsize=20,
+                                           max_retries=Retry(total=5,
+                                                             backoff_factor=1.0,
+                                                             status_forcelist=(500, 502, 503, 504),
+                                                             allowed_methods=frozenset(('GET', 'HEAD'))))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
         find_params: Dict = {'repo': self.SECURE_COMMUNICATION_REPO,
                              'path': {'$match': f"*{self.ARCH_FLAVOR}*"},
                              'name': f"{self.IMAGE_FILE_NAME}"}
         sort_params: Dict = {'$desc': ['updated']}
 
+        # json.dumps produces correctly quoted AQL JSON directly - no full-string
+        # replace pass, and values containing quotes can no longer corrupt the query
         self.last_image_query: str = (
-            f'items.find({find_params}).sort({sort_params}).limit(1)'.replace('\'', '\"'))
+            f'items.find({json.dumps(find_params)}).sort({json.dumps(sort_params)}).limit(1)')
+
+        # Conditional-request state for 'get_latest_build': the cached answer is returned
+        # on '304 Not Modified' without re-parsing the listing
+        self._last_etag: Optional[str] = None
+        self._last_build: Optional[Tuple[datetime.datetime, str]] = None
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> Artifactory:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
 
     def get_latest_build(self) -> Tuple[datetime.datetime, str]:
-        with requests.Session() as session:
-            session.auth = (self.username, self.password)
-            print(self.api_url,)
-            response: Response = session.post(self.api_url, data=self.last_image_query)
-            if HTTPStatus.OK != response.status_code:
-                raise RuntimeError('Failed to find files matching pattern')
+        headers: Dict[str, str] = {'If-None-Match': self._last_etag} if self._last_etag else {}
+        response: Response = self.session.post(self.api_url, data=self.last_image_query, headers=headers)
+        if HTTPStatus.NOT_MODIFIED == response.status_code and self._last_build:
+            return self._last_build
+        if HTTPStatus.OK != response.status_code:
+            raise RuntimeError('Failed to find files matching pattern')
 
-            results: List = response.json()['results']
-            if not results:
-                raise RuntimeError(f'Empty results: {response.json()}')
+        results: List = response.json()['results']
+        if not results:
+            raise RuntimeError(f'Empty results: {response.json()}')
 
-            artifact: Dict = results[0]
+        artifact: Dict = results[0]
 
-            date_str_no_mills: str = artifact['updated'].split('.')[0]
-            date = datetime.datetime.strptime(date_str_no_mills, self.UPDATED_ATTR_FORMAT)
+        date_str_no_mills: str = artifact['updated'].split('.')[0]
+        date = datetime.datetime.strptime(date_str_no_mills, self.UPDATED_ATTR_FORMAT)
 
-            return date, artifact['path']
+        self._last_etag = response.headers.get('ETag')
+        self._last_build = (date, artifact['path'])
+
+        return self._last_build
 
     def download_artifact(self,
                           artifact_path: str,
-                          destination_file: str) -> Tuple[bool, str]:
-        with requests.Session() as session:
-            session.auth = (self.username, self.password)
-            file_url: str = f'{self.host}/{self.SECURE_COMMUNICATION_REPO}/{urllib.parse.quote(artifact_path)}'
-            response: Response = session.get(file_url, stream=True)
-            if HTTPStatus.OK != response.status_code:
-                return False, f'Failed to get the artifact file: {file_url}'
+                          destination_file: str) -> Tuple[bool, str, int]:
+        file_url: str = f'{self.host}/{self.SECURE_COMMUNICATION_REPO}/{urllib.parse.quote(artifact_path)}'
+
+        # Large static files are fetched with several parallel range GETs - a single
+        # connection is limited by the TCP window / per-connection server throttling;
+        # any failure (including a server that answers 200 to a ranged request) falls
+        # back to the resumable single-stream download below
+        total_size: Optional[int] = self._remote_file_size(file_url)
+
+        # Each build lives at its own path, so an existing destination of the exact
+        # remote size is this very artifact - skip the redundant transfer entirely.
+        # The check is sound because the destination only ever appears through the
+        # atomic rename of a verified-complete '.part' file below
+        if total_size is not None:
+            with contextlib.suppress(OSError):
+                if os.stat(destination_file).st_size == total_size:
+                    return True, 'Already up-to-date', total_size
+
+        # All the bytes land in a '.part' sibling first: a crash mid-download (the
+        # ranged path pre-truncates to the full size before any byte arrives) can no
+        # longer leave an exact-size hole-filled file behind at the final name
+        part_file: str = f'{destination_file}.part'
+        if total_size and total_size >= self.DOWNLOAD_PARALLEL_MIN_SIZE:
+            if self._download_ranges(file_url, part_file, total_size):
+                os.replace(part_file, destination_file)
+                return True, 'OK', total_size
+
+        success, message, bytes_written = self._download_streamed(file_url, part_file)
+        if success:
+            os.replace(part_file, destination_file)
+
+        return success, message, bytes_written
 
-            with open(destination_file, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    file.write(chunk)
+    def _remote_file_size(self, file_url: str) -> Optional[int]:
+        try:
+            response: Response = self.session.head(file_url,
+                                                   headers={'Accept-Encoding': 'identity'})
+        except requests.RequestException:
+            return None
+        if HTTPStatus.OK != response.status_code:
+            return None
 
-            return True, 'OK'
+        content_length: Optional[str] = response.headers.get('Content-Length')
+        return int(content_length) if content_length else None
+
+    def _download_ranges(self,
+                         file_url: str,
+                         destination_file: str,
+                         total_size: int) -> bool:
+        workers: int = self.DOWNLOAD_RANGE_WORKERS
+        chunk_size: int = -(-total_size // workers)
+        ranges: List[Tuple[int, int]] = [(low, min(low + chunk_size, total_size) - 1)
+                                         for low in range(0, total_size, chunk_size)]
+
+        # Pre-size the destination so every worker can pwrite its own slice
+        with open(destination_file, 'wb') as file:
+            file.truncate(total_size)
+
+        def fetch_range(byte_range: Tuple[int, int]) -> bool:
+            low, high = byte_range
+            try:
+                response: Response = self.session.get(
+                    file_url, stream=True,
+                    headers={'Range': f'bytes={low}-{high}', 'Accept-Encoding': 'identity'})
+                if HTTPStatus.PARTIAL_CONTENT != response.status_code:
+                    return False
+                response.raw.decode_content = True
+                with open(destination_file, 'rb+') as part_file:
+                    part_file.seek(low)
+                    shutil.copyfileobj(response.raw, part_file, length=self.DOWNLOAD_BUFFER_SIZE)
+                    complete: bool = part_file.tell() == high + 1
+                    # The slice will not be re-read here - release its page cache
+                    with contextlib.suppress(OSError):
+                        os.posix_fadvise(part_file.fileno(), low, high - low + 1,
+                                         os.POSIX_FADV_DONTNEED)
+                    return complete
+            except requests.RequestException:
+                return False
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return all(executor.map(fetch_range, ranges))
+
+    def _download_streamed(self,
+                           file_url: str,
+                           destination_file: str) -> Tuple[bool, str, int]:
+        bytes_written: int = 0
+        total_size: Optional[int] = None
+        for _ in range(self.DOWNLOAD_MAX_ATTEMPTS):
+            # After a mid-stream failure resume from the last written byte instead of
+            # restarting the multi-hundred-MB transfer from scratch
+            # 'identity' keeps the server from compressing the (already compressed) image,
+            # which would only burn CPU on both ends and break the Range arithmetic
+            headers: Dict[str, str] = {'Accept-Encoding': 'identity'}
+            if bytes_written:
+                headers['Range'] = f'bytes={bytes_written}-'
+            response: Response = self.session.get(file_url, stream=True, headers=headers)
+
+            if HTTPStatus.OK == response.status_code:
+                # Full body: either the first attempt, or the server ignored the Range header
+                bytes_written = 0
+                content_length: str = response.headers.get('Content-Length')
+                total_size = int(content_length) if content_length else None
+            elif not (bytes_written and HTTPStatus.PARTIAL_CONTENT == response.status_code):
+                return False, f'Failed to get the artifact file: {file_url}', bytes_written
+
+            # copyfileobj streams in a tight C loop; the 1 MiB buffer keeps both the Python
+            # iteration count and the write syscall count low for the image download
+            response.raw.decode_content = True
+            interrupted: bool = False
+            with open(destination_file, 'ab' if bytes_written else 'wb') as file:
+                with contextlib.suppress(OSError):
+                    os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                try:
+                    shutil.copyfileobj(response.raw, file, length=self.DOWNLOAD_BUFFER_SIZE)
+                except (requests.exceptions.ConnectionError,
+                        requests.exceptions.ChunkedEncodingError):
+                    interrupted = True
+                bytes_written = file.tell()
+                # A multi-GB download should not evict the rest of the page cache
+                with contextlib.suppress(OSError):
+                    os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+            if interrupted or (total_size is not None and bytes_written < total_size):
+                continue
+
+            if total_size is not None and bytes_written > total_size:
+                return False, (f'Corrupted download: got {bytes_written} '
+                               f'of {total_size} bytes from {file_url}'), bytes_written
+
+            return True, 'OK', bytes_written
+
+        return False, (f'Download of {file_url} did not complete '
+                       f'after {self.DOWNLOAD_MAX_ATTEMPTS} attempts'), bytes_written
 
     def download_artifact_by_hash(self,
                                   repo_name: str,
                                   commit_hash: str,
                                   file_name: str,
                                   destination_file: str) -> Tuple[bool, str]:
-        with requests.Session() as session:
-            session.auth = (self.username, self.password)
-
-            api_pattern_query: str = ('items.find({"repo":"' + repo_name + '", "path":{"$match":"*' + self.ARCH_FLAVOR +
-                                      '*' + commit_hash + '*"}, "name": "' + file_name + '"})')
-            response: Response = session.post(self.api_url, data=api_pattern_query)
-            if HTTPStatus.OK != response.status_code:  # HTTP_OK
-                return False, (f'Failed to find files matching pattern: '
-                               f'[repo: {repo_name}, path: *{commit_hash}, name: {file_name}]')
+        find_params: Dict = {'repo': repo_name,
+                             'path': {'$match': f'*{self.ARCH_FLAVOR}*{commit_hash}*'},
+                             'name': file_name}
+        api_pattern_query: str = f'items.find({json.dumps(find_params)})'
+        response: Response = self.session.post(self.api_url, data=api_pattern_query)
+        if HTTPStatus.OK != response.status_code:  # HTTP_OK
+            return False, (f'Failed to find files matching pattern: '
+                           f'[repo: {repo_name}, path: *{commit_hash}, name: {file_name}]')
 
-            results: List = response.json()['results']
-            if not results:
-                return False, f'Empty result: {response.json()}'
+        results: List = response.json()['results']
+        if not results:
+            return False, f'Empty result: {response.json()}'
 
-            artifact: Dict = dict(results[0])
-            path = artifact['path'] + "/" + artifact['name']
+        artifact: Dict = dict(results[0])
+        path = artifact['path'] + "/" + artifact['name']
 
-            file_url: str = f'{self.host}/{repo_name}/{urllib.parse.quote(path)}'
+        file_url: str = f'{self.host}/{repo_name}/{urllib.parse.quote(path)}'
 
-            response = session.get(file_url, stream=True)
-            if HTTPStatus.OK != response.status_code:  # HTTP_OK
-                return False, f'Failed to get the artifact file: {file_url}'
+        response = self.session.get(file_url, stream=True, headers={'Accept-Encoding': 'identity'})
+        if HTTPStatus.OK != response.status_code:  # HTTP_OK
+            return False, f'Failed to get the artifact file: {file_url}'
 
-            with open(destination_file, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    file.write(chunk)
+        # copyfileobj streams in a tight C loop instead of a Python iteration per 8 KiB
+        response.raw.decode_content = True
+        with open(destination_file, 'wb') as file:
+            shutil.copyfileobj(response.raw, file, length=self.DOWNLOAD_BUFFER_SIZE)
 
-            return True, 'OK'
+        return True, 'OK'
 
     def download_image_by_hash(self,
                                commit_hash: str,
@@ -1,31 +1,40 @@
 import logging.config
+import threading
 from pathlib import Path
 from config.Configuration import Configuration
 
 log: logging.Logger = None
 
+_init_lock: threading.Lock = threading.Lock()
+
 
 def init_logger() -> logging.Logger:
+    global log
 
-    logging.basicConfig(level=logging.DEBUG)
+    # The fast path: every caller after the first returns the ready logger without
+    # re-running basicConfig or opening another FileHandler fd
+    if log:
+        return log
 
-    # Removing the external loggers tracing:
-    logging.getLogger("paramiko.transport").setLevel(logging.WARNING)
-    logging.getLogger("urllib3.connectionpool").setLevel(logging.WARNING)
-    logging.getLogger("faker.factory").setLevel(logging.WARNING)
+    with _init_lock:
+        if log:
+            return log
 
-    config = Configuration.get_configuration()
-    Path(config.pxe_server.logs_dir).mkdir(parents=True, exist_ok=True)
-    file_handler: logging.Handler = logging.FileHandler(f'{config.pxe_server.logs_dir}/deployment.log')
-    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        logging.basicConfig(level=logging.DEBUG)
 
-    global log
-    if log:
-        return log
+        # Removing the external loggers tracing:
+        logging.getLogger("paramiko.transport").setLevel(logging.WARNING)
+        logging.getLogger("urllib3.connectionpool").setLevel(logging.WARNING)
+        logging.getLogger("faker.factory").setLevel(logging.WARNING)
 
-    log = logging.getLogger(__file__)
-    log.addHandler(file_handler)
-    log.name = "Deployment"
+        config = Configuration.get_configuration()
+        Path(config.pxe_server.logs_dir).mkdir(parents=True, exist_ok=True)
+        file_handler: logging.Handler = logging.FileHandler(f'{config.pxe_server.logs_dir}/deployment.log')
+        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
 
-    return log
+        logger: logging.Logger = logging.getLogger("Deployment")
+        logger.addHandler(file_handler)
 
+        log = logger
+
+    return log
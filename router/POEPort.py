@@ -1,6 +1,7 @@
 from __future__ import annotations
+import re
 from enum import Enum
-from typing import Dict
+from typing import Dict, Optional
 
 
 class POEPort(object):
@@ -10,12 +11,14 @@ class POEPort(object):
         On = 'auto-on'
         ForcedON = 'forced-on'
 
-        @staticmethod
-        def from_string(value: str) -> POEPort.Power:
-            for state in POEPort.Power:
-                if state.value == value:
-                    return state
-            raise ValueError(f'Value "{value}" is unsupported')
+        @classmethod
+        def from_string(cls, value: str) -> POEPort.Power:
+            # Enum already maintains the value -> member reverse map; a dict hit
+            # beats the old linear scan over the members
+            state: Optional[POEPort.Power] = cls._value2member_map_.get(value)
+            if state is None:
+                raise ValueError(f'Value "{value}" is unsupported')
+            return state
 
         def __str__(self) -> str:
             return self.value
@@ -28,12 +31,12 @@ class POEPort(object):
         Low = 'low'
         High = 'high'
 
-        @staticmethod
-        def from_string(value: str) -> POEPort.Voltage:
-            for volt in POEPort.Voltage:
-                if volt.value == value:
-                    return volt
-            raise ValueError(f'Value "{value}" is unsupported')
+        @classmethod
+        def from_string(cls, value: str) -> POEPort.Voltage:
+            voltage: Optional[POEPort.Voltage] = cls._value2member_map_.get(value)
+            if voltage is None:
+                raise ValueError(f'Value "{value}" is unsupported')
+            return voltage
 
         def __str__(self) -> str:
             return self.value
@@ -74,11 +77,31 @@ class POEPort(object):
     def cycle_ping_enabled(self, enabled) -> None:
         self.__cycle_ping_enabled = self.extract_boolean_parameter(enabled)
 
+    @classmethod
+    def _from_match(cls, match: re.Match) -> POEPort:
+        """
+        Builds the port straight from a 'poe print' table-row match (see
+        MikroTikClient._POE_ROW_RE), bypassing the property-setter ceremony
+        """
+        name, state, voltage, priority, lldp_enabled, cycle_ping_enabled, _ = match.groups()
+
+        port: POEPort = cls(name)
+        port.state = cls.Power.from_string(state)
+        port.voltage = cls.Voltage.from_string(voltage)
+        port.__priority = cls.cast_to_int(priority)
+        port.__lldp_enabled = cls.str_to_bool(lldp_enabled)
+        port.__cycle_ping_enabled = cls.str_to_bool(cycle_ping_enabled)
+        return port
+
+    TRUE_STRINGS: frozenset = frozenset(('1', 'yes', 'true', 'enabled', 'y'))
+    FALSE_STRINGS: frozenset = frozenset(('0', 'n', 'no', 'none', 'false', 'disabled'))
+
     @staticmethod
     def str_to_bool(value: str) -> bool:
-        if value.lower() in ['1', 'yes', 'true', 'enabled', 'y']:
+        lowered: str = value.lower()
+        if lowered in POEPort.TRUE_STRINGS:
             return True
-        elif value.lower() in ['0', 'n', 'no', 'none', 'false', 'disabled']:
+        elif lowered in POEPort.FALSE_STRINGS:
             return False
         else:
             raise ValueError(f'Can not cast from String "{value}" to the Boolean type')
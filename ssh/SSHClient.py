@@ -1,22 +1,29 @@
 from __future__ import annotations
+import select
 import socket
+import threading
 import time
 import paramiko
 from scp import SCPClient
 
 from contextlib import ContextDecorator
-from typing import Tuple
+from typing import Dict, List, Optional, Tuple
 from common.CommandRunner import ICommandRunner
+from ssh.SSHConnectionPool import pool
 
 
 # TODO:
-#   1. Connection pool
-#   2. Logger
+#   1. Logger
 class SSHClient(ICommandRunner):
     SSH_PORT_DEFAULT: int = 22
     RECV_BUFFER_SIZE: int = 65535
     RECV_SOCKET_TIMEOUT: float = 0.5
-    ENCODING: str = 'UTF-8'
+    # scp's default block size is 16 KiB; 1 MiB keeps a fat link window-limited
+    # instead of block-limited
+    SCP_BUFFER_SIZE: int = 1 << 20
+    # Lowercase spelling hits CPython's dedicated UTF-8 codec fast path instead
+    # of going through alias resolution on every decode
+    ENCODING: str = 'utf-8'
 
     class ConnectionContext(ContextDecorator):
 
@@ -28,109 +35,189 @@ class SSHClient(ICommandRunner):
             return self
 
         def __exit__(self, *exc):
-            self.ssh_client.close()
+            # The connection goes back to the shared pool instead of being torn down;
+            # a keep-alive client additionally holds on to it between the commands
+            if not self.ssh_client.keep_alive:
+                self.ssh_client.release()
             return False
 
     def __init__(self,
                  hostname: str,
                  username: str,
                  password: str,
-                 port: int = SSH_PORT_DEFAULT):
+                 port: int = SSH_PORT_DEFAULT,
+                 keep_alive: bool = False):
         # self.logger = logging.getLogger("SSHClient")
 
         self.hostname: str = hostname
         self.username: str = username
         self.password: str = password
         self.port: int = port
+        self.keep_alive: bool = keep_alive
+        self._connect_lock: threading.Lock = threading.Lock()
 
-        # self.status = None
-
-        self.client: paramiko.SSHClient = paramiko.SSHClient()
-        # self.client.load_system_host_keys()
-        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        # The paramiko client is checked out of the pool on connect() and handed
+        # back on release(); between the two it is exclusively ours
+        self.client: Optional[paramiko.SSHClient] = None
 
     @property
     def host(self) -> str:
         return self.hostname
 
-    # TODO: Refactor
+    def is_connected(self) -> bool:
+        if self.client is None:
+            return False
+        transport: paramiko.Transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
     def connect(self) -> None:
-        self.client.connect(hostname=self.hostname,
-                            username=self.username,
-                            password=self.password,
-                            port=self.port,
-                            look_for_keys=False,
-                            allow_agent=False)
+        with self._connect_lock:
+            if self.is_connected():
+                return
+            self.client = pool.acquire(self.hostname, self.username, self.password, self.port)
+
+    def release(self) -> None:
+        with self._connect_lock:
+            if self.client is not None:
+                pool.release(self.hostname, self.username, self.port, self.client)
+                self.client = None
 
     def close(self) -> None:
-        self.client.close()
+        with self._connect_lock:
+            if self.client is not None:
+                self.client.close()
+                self.client = None
 
-    # TODO: Refactor: use pool??
-    #       handle possible exceptions
+    # TODO: handle possible exceptions
     def exec(self, cmd: str, timeout: int | None = None) -> Tuple[str, int]:
-        with SSHClient.ConnectionContext(self):
-            stdin, stdout, stderr = self.client.exec_command(command=cmd, timeout=timeout)
-            data: str = (stdout.read() + stderr.read()).decode(SSHClient.ENCODING)
-            return data, stdout.channel.recv_exit_status()
+        return self.exec_many([cmd], timeout=timeout)[0]
+
+    def exec_many(self,
+                  cmds: List[str],
+                  timeout: float | None = None) -> List[Tuple[str, int]]:
+        """
+        Runs all the commands as concurrent channels multiplexed over one
+        authenticated transport: N commands cost a single TCP+SSH handshake plus N
+        cheap CHANNEL_OPENs instead of N handshakes. One select loop drains every
+        channel as output arrives, so the slowest command bounds the wall time
+
+        :param cmds: command lines to run remotely
+        :param timeout: overall deadline in seconds (None - wait indefinitely)
+
+        :return: per-command (stdout+stderr output, exit status) tuples, in order;
+                 commands still running at the deadline report exit status -1
+        """
+        if not cmds:
+            return []
 
-    def run_executable(self, cmd: str, timeout: float = 60.0) -> Tuple[str, int]:
-        with SSHClient.ConnectionContext(self) as ctx:
-            command, output = bytes(f'{cmd}\n', encoding=SSHClient.ENCODING), ""
-            exit_status: int = -1
-            with self.client.invoke_shell() as shell:
-                shell.send(command)
-                shell.settimeout(self.RECV_SOCKET_TIMEOUT)
-
-                start: float = time.time()
-                while timeout > (time.time() - start):
-                    try:
-                        output += shell.recv(self.RECV_BUFFER_SIZE).decode(SSHClient.ENCODING)
-                    except socket.timeout:
-                        continue
-
-                shell.close()
-                ctx.ssh_client.client.close()
-
-                print('exit_status = ', shell.exit_status)
-
-                '''
-                if not shell.exit_status_ready():
-                    shell.close()
-                try:
+        with SSHClient.ConnectionContext(self):
+            transport: paramiko.Transport = self.client.get_transport()
+
+            channels: List[paramiko.Channel] = []
+            for cmd in cmds:
+                channel: paramiko.Channel = transport.open_session()
+                # stderr is merged into the stdout stream by the channel itself:
+                # one linear read per command instead of two stream drains
+                channel.set_combine_stderr(True)
+                channel.exec_command(cmd)
+                channels.append(channel)
+
+            index_by_channel: Dict[int, int] = {id(channel): idx
+                                                for idx, channel in enumerate(channels)}
+            outputs: List[bytearray] = [bytearray() for _ in channels]
+            statuses: List[int] = [-1] * len(channels)
+
+            deadline: Optional[float] = None if timeout is None else time.monotonic() + timeout
+            pending: set = set(range(len(channels)))
+            while pending:
+                wait: float = self.RECV_SOCKET_TIMEOUT
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        break
+
+                ready, _, _ = select.select([channels[idx] for idx in pending], [], [], wait)
+                for channel in ready:
+                    idx: int = index_by_channel[id(channel)]
+                    while channel.recv_ready():
+                        outputs[idx] += channel.recv(self.RECV_BUFFER_SIZE)
+
+                    if channel.exit_status_ready() and not channel.recv_ready():
+                        statuses[idx] = channel.recv_exit_status()
+                        channel.close()
+                        pending.discard(idx)
+
+            for idx in pending:
+                channels[idx].close()
+
+            # bytearray decodes in place - no intermediate bytes copy of the payload
+            return [(outputs[idx].decode(SSHClient.ENCODING), statuses[idx])
+                    for idx in range(len(channels))]
+
+    def _drain_shell(self,
+                     shell: paramiko.Channel,
+                     timeout: float) -> Tuple[bytearray, int]:
+        """
+        Collects the shell output until the channel exits, hits EOF or the deadline
+        passes. The wait is select-driven - the call returns the instant the remote
+        side finishes instead of polling on a socket timeout for the full duration
+
+        :return: (raw output, exit status); -1 when the shell did not exit in time
+        """
+        output: bytearray = bytearray()
+        exit_status: int = -1
+
+        deadline: float = time.monotonic() + timeout
+        while True:
+            if shell.exit_status_ready():
+                while shell.recv_ready():
+                    output += shell.recv(self.RECV_BUFFER_SIZE)
+                exit_status = shell.recv_exit_status()
+                break
+
+            remaining: float = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            ready, _, _ = select.select([shell], [], [], remaining)
+            if not ready:
+                continue
+
+            chunk: bytes = shell.recv(self.RECV_BUFFER_SIZE) if shell.recv_ready() else b''
+            if not chunk:
+                # EOF: grab the status if it arrived with the close
+                if shell.exit_status_ready():
                     exit_status = shell.recv_exit_status()
-                except socket.timeout:
-                    pass
-                '''
+                break
+            output += chunk
 
-            return output, exit_status
+        return output, exit_status
+
+    def run_executable(self, cmd: str, timeout: float = 60.0) -> Tuple[str, int]:
+        # Running a single executable needs neither a pty nor an interactive shell:
+        # the exec path skips the remote shell spawn and the cooked-mode line
+        # discipline (echo, CR/LF translation) that a pty forces on every byte
+        return self.exec(cmd, timeout=timeout)
 
     def run_executable_new(self, cmd: str, timeout: float = 60.0) -> Tuple[str, int]:
+        """
+        Variant for executables that genuinely need a terminal (isatty checks,
+        progress output). A dumb pty is allocated on a plain exec channel - no
+        remote interactive shell is spawned, and stderr stays in the one stream
+        """
         with SSHClient.ConnectionContext(self):
-            command, output = bytes(f'{cmd}\n', encoding=SSHClient.ENCODING), ""
-            exit_command = bytes(f'exit $?\n', encoding=SSHClient.ENCODING)
-            exit_status: int = -1
-            with self.client.invoke_shell() as shell:
-                shell.send(command)
-                shell.settimeout(self.RECV_SOCKET_TIMEOUT)
-                start: float = time.time()
-                while timeout > (time.time() - start):
-                    try:
-                        output += shell.recv(self.RECV_BUFFER_SIZE).decode(SSHClient.ENCODING)
-                    except socket.timeout:
-                        continue
-                if not shell.exit_status_ready():
-                    shell.close()
-
-                shell.send(exit_command)
-                try:
-                    exit_status = shell.recv_exit_status()
-                except socket.timeout:
-                    pass
-                    if not shell.exit_status_ready():
-                        shell.close()
+            channel: paramiko.Channel = self.client.get_transport().open_session()
+            channel.get_pty(term='dumb')
+            channel.set_combine_stderr(True)
+            channel.exec_command(cmd)
+            output, exit_status = self._drain_shell(channel, timeout)
+            channel.close()
 
-            return output, exit_status
+            return output.decode(SSHClient.ENCODING), exit_status
 
     def upload_file(self, src_file: str, dst_file: str) -> None:
-        with SSHClient.ConnectionContext(self), SCPClient(self.client.get_transport()) as scp:
+        # The transport comes out of the shared pool, so the upload pays for a channel
+        # open rather than a full TCP+SSH handshake
+        with SSHClient.ConnectionContext(self), \
+                SCPClient(self.client.get_transport(), buff_size=SSHClient.SCP_BUFFER_SIZE) as scp:
             scp.put(src_file, dst_file)
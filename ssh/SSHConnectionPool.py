@@ -0,0 +1,169 @@
+from __future__ import annotations
+import socket
+import threading
+import paramiko
+
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, Tuple
+
+
+class SSHConnectionPool(object):
+    """
+    Pool of authenticated paramiko clients keyed by (hostname, username, port)
+
+    The TCP + SSH handshake (kex, auth) dominates the latency of short remote
+    commands, so instead of connecting and closing per call the clients are parked
+    here between uses and handed back out while their transport is still alive.
+    Idle members send keepalives so they survive NAT/firewall timeouts
+    """
+
+    # Stays below the OpenSSH MaxStartups default (10), so a burst of fresh
+    # connects from the pool can never trip the server's throttling
+    MAX_IDLE_PER_KEY: int = 8
+    KEEPALIVE_INTERVAL: int = 30
+    CONNECT_TIMEOUT: float = 10.0
+
+    # Preferred offer for the fast path: modern OpenSSH peers all take it and the
+    # short lists shorten the kex negotiation on each cold connect. Entries unknown
+    # to the local paramiko are skipped, and peers that reject the offer entirely
+    # (e.g. RouterOS before 6.45 has no curve25519) get one retry with paramiko's
+    # full preference lists in '_create'
+    KEX_ALGORITHMS: Tuple[str, ...] = ('curve25519-sha256', 'curve25519-sha256@libssh.org')
+    CIPHERS: Tuple[str, ...] = ('aes128-gcm@openssh.com', 'aes128-ctr')
+
+    def __init__(self,
+                 max_idle_per_key: int = MAX_IDLE_PER_KEY) -> None:
+        self.max_idle_per_key: int = max_idle_per_key
+        self._lock: threading.Lock = threading.Lock()
+        self._idle: Dict[Tuple[str, str, int], Deque[paramiko.SSHClient]] = {}
+
+    def acquire(self,
+                hostname: str,
+                username: str,
+                password: str,
+                port: int) -> paramiko.SSHClient:
+        key: Tuple[str, str, int] = (hostname, username, port)
+        with self._lock:
+            idle: Deque[paramiko.SSHClient] = self._idle.get(key, deque())
+            while idle:
+                client: paramiko.SSHClient = idle.pop()
+                if self._is_healthy(client):
+                    return client
+                client.close()
+
+        # Nothing healthy parked for this key - connect outside the lock so a slow
+        # handshake never stalls the other keys
+        return self._create(hostname, username, password, port)
+
+    def release(self,
+                hostname: str,
+                username: str,
+                port: int,
+                client: paramiko.SSHClient) -> None:
+        key: Tuple[str, str, int] = (hostname, username, port)
+        transport: paramiko.Transport = client.get_transport()
+        if transport is None or not transport.is_active():
+            client.close()
+            return
+
+        with self._lock:
+            idle: Deque[paramiko.SSHClient] = self._idle.setdefault(key, deque())
+            if len(idle) < self.max_idle_per_key:
+                idle.append(client)
+                return
+
+        client.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            for idle in self._idle.values():
+                while idle:
+                    idle.pop().close()
+            self._idle.clear()
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _resolve(hostname: str) -> str:
+        """
+        Resolves the hostname to a numeric address once per process
+
+        Reconnects to the same host (retries, pool refills) skip the resolver
+        round trip; an unresolvable name is passed through untouched so connect
+        reports the canonical error
+        """
+        try:
+            return socket.getaddrinfo(hostname, None,
+                                      socket.AF_INET, socket.SOCK_STREAM)[0][4][0]
+        except OSError:
+            return hostname
+
+    @classmethod
+    def _transport_factory(cls, sock, **kwargs) -> paramiko.Transport:
+        transport: paramiko.Transport = paramiko.Transport(sock, **kwargs)
+        options: paramiko.SecurityOptions = transport.get_security_options()
+
+        preferred_kex: Tuple[str, ...] = tuple(name for name in cls.KEX_ALGORITHMS
+                                               if name in options.kex)
+        if preferred_kex:
+            options.kex = preferred_kex
+
+        preferred_ciphers: Tuple[str, ...] = tuple(name for name in cls.CIPHERS
+                                                   if name in options.ciphers)
+        if preferred_ciphers:
+            options.ciphers = preferred_ciphers
+
+        return transport
+
+    def _create(self,
+                hostname: str,
+                username: str,
+                password: str,
+                port: int) -> paramiko.SSHClient:
+        try:
+            return self._connect(hostname, username, password, port,
+                                 transport_factory=self._transport_factory)
+        except paramiko.AuthenticationException:
+            # The negotiation succeeded - a different offer will not fix bad credentials
+            raise
+        except paramiko.SSHException:
+            # The peer rejected the trimmed algorithm offer - retry once with
+            # paramiko's full preference lists
+            return self._connect(hostname, username, password, port)
+
+    def _connect(self,
+                 hostname: str,
+                 username: str,
+                 password: str,
+                 port: int,
+                 transport_factory=None) -> paramiko.SSHClient:
+        client: paramiko.SSHClient = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(hostname=self._resolve(hostname),
+                       username=username,
+                       password=password,
+                       port=port,
+                       timeout=self.CONNECT_TIMEOUT,
+                       look_for_keys=False,
+                       allow_agent=False,
+                       transport_factory=transport_factory)
+        client.get_transport().set_keepalive(self.KEEPALIVE_INTERVAL)
+        return client
+
+    @staticmethod
+    def _is_healthy(client: paramiko.SSHClient) -> bool:
+        transport: paramiko.Transport = client.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+
+        try:
+            # A cheap round-trip-less probe: fails immediately on a dead socket
+            transport.send_ignore()
+            return True
+        except (EOFError, OSError):
+            return False
+
+
+# One shared pool for the whole process - every SSHClient instance with the same
+# credentials transparently reuses the same parked connections
+pool: SSHConnectionPool = SSHConnectionPool()
@@ -1,15 +1,29 @@
+import asyncio
+import errno
+import logging
+import os
+import select
+import shlex
 import subprocess
 import sys
 import socket
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
 from enum import Enum
+from pathlib import Path
 
 from typing import Tuple, List
 
 from ping3 import ping
-from scapy.layers.inet import TCP, IP
-from scapy.sendrecv import sr1
-from scapy.volatile import RandShort
+
+try:
+    from icmplib import multiping
+except ImportError:
+    # icmplib batches all the probes on one socket; without it the helpers below
+    # fall back to concurrent per-host ping3 calls
+    multiping = None
 
 
 class FileUtilities(object):
@@ -20,18 +34,62 @@ class FileUtilities(object):
         Append = 'a'
         CreateAndWrite = 'x'
 
+    WRITE_OPEN_FLAGS: dict = {
+        Mode.Overwrite: os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+        Mode.Append: os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+        Mode.CreateAndWrite: os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+    }
+
     @staticmethod
     def read_file_lines(file_path: str,
                         mode: Mode = Mode.ReadText) -> List[str]:
+        # One bulk read + a C-level splitlines instead of a Python-level
+        # iteration (and an rstrip allocation) per line
         with open(file_path, mode.value) as file:
-            return [raw_line.rstrip('\n') for raw_line in file]
+            return file.read().splitlines()
 
     @staticmethod
     def write_lines_to_file(file_path: str,
                             lines: List[str],
                             mode: Mode = Mode.Overwrite) -> None:
-        with open(file_path, mode.value) as file:
-            file.writelines([(line + '\n') for line in lines])
+        # The pre-joined payload goes out through one os.write: a single syscall
+        # with no io-stack buffering in between
+        payload: bytes = ('\n'.join(lines) + '\n').encode('utf-8')
+        fd: int = os.open(file_path, FileUtilities.WRITE_OPEN_FLAGS[mode], 0o644)
+        try:
+            os.write(fd, payload)
+        finally:
+            os.close(fd)
+
+
+def find_latest_artifact_dir(artifacts_dir: str,
+                             folder_format: str) -> Tuple[datetime, Path]:
+    """
+    Finds the most recent build folder (named by the 'folder_format' timestamp layout)
+    inside the artifacts directory
+
+    Uses a single os.scandir pass: the DirEntry caches the stat data, and because the
+    zero-padded 'YYYY_MM_DD_HH_MM_SS' names sort chronologically, a plain string
+    comparison replaces a strptime call per entry - only the winner is parsed once
+
+    :param artifacts_dir: directory containing the per-build artifact folders
+    :param folder_format: strftime/strptime layout of the folder names
+
+    :return: Tuple of [folder timestamp, folder path]; [datetime(1, 1, 1), Path()] if none found
+    """
+
+    name_length: int = len(datetime(year=2000, month=1, day=1).strftime(folder_format))
+    best_name, best_entry = '', None
+    with os.scandir(artifacts_dir) as entries:
+        for entry in entries:
+            if entry.name > best_name and name_length == len(entry.name) \
+                    and entry.is_dir(follow_symlinks=False):
+                best_name, best_entry = entry.name, entry
+
+    if best_entry is None:
+        return datetime(year=1, month=1, day=1), Path()
+
+    return datetime.strptime(best_name, folder_format), Path(best_entry.path).absolute()
 
 
 def run_command(cmd: str,
@@ -43,32 +101,80 @@ def run_command(cmd: str,
                                 shell=shell,
                                 stdout=subprocess.PIPE,
                                 stderr=subprocess.STDOUT)
-        output: str = ''
-        while True:
-            line = proc.stdout.readline()
-            if not line:
-                break
-            if print_output:
-                print(str(line.rstrip()).strip("b'"))
-                sys.stdout.flush()
-
-            output += line
+        if not print_output:
+            # Nothing to echo - one bulk read instead of a readline syscall per line
+            output, _ = proc.communicate()
+            return output, proc.returncode
+
+        # Chunks are joined once at the end: repeated 'output += line' re-copies the
+        # whole accumulated string on every line (quadratic for large outputs)
+        chunks: List[str] = []
+        for line in proc.stdout:
+            print(line.rstrip())
+            sys.stdout.flush()
+            chunks.append(line)
 
         proc.wait()
-        return output, proc.returncode
+        return ''.join(chunks), proc.returncode
 
     except OSError as exc:
         return f"Can't run process. Error code = {exc}", -1
 
 
+def run_command_streaming(cmd: str,
+                          logger: logging.Logger) -> int:
+    """
+    Runs the command, forwarding every output line to the logger as it appears
+
+    Unlike 'run_command' the full output is never accumulated in memory, so long-running
+    processes with large logs (e.g. RobotFramework runs) surface their progress in real
+    time and keep the peak memory flat
+
+    :param cmd: command line to run
+    :param logger: logger receiving the process output (DEBUG level)
+
+    :return: process exit code (-1 in case the process could not be started)
+    """
+
+    try:
+        proc = subprocess.Popen(shlex.split(cmd),
+                                text=True,
+                                bufsize=1,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+    except OSError as exc:
+        logger.error(f"Can't run process. Error code = {exc}")
+        return -1
+
+    for line in proc.stdout:
+        logger.debug(line.rstrip())
+
+    return proc.wait()
+
+
+@lru_cache(maxsize=1024)
+def _resolve(host: str) -> str:
+    """
+    Resolves the host to a numeric address once per process
+
+    The reachability helpers below retry against the same hosts dozens of times;
+    feeding connect a numeric address skips a resolver round trip per probe. An
+    unresolvable name is passed through untouched so the probe fails normally
+    """
+    try:
+        return socket.getaddrinfo(host, None, socket.AF_INET, socket.SOCK_STREAM)[0][4][0]
+    except OSError:
+        return host
+
+
 def is_reachable(host, port, timeout=2):
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
         try:
-            sock.settimeout(timeout)
-            sock.connect((host, int(port)))
-            sock.shutdown(socket.SHUT_RDWR)
-            return True
-        except:
+            # connect_ex reports refusal/timeout as an errno return value, so the
+            # common negative probe never pays for raising and catching an exception
+            return 0 == sock.connect_ex((_resolve(host), int(port)))
+        except OSError:
             return False
 
 
@@ -80,8 +186,153 @@ def is_host_reachable(host: str) -> bool:
 def is_port_open(host: str,
                  port: int,
                  timeout: float = 1.0) -> bool:
-    packet = sr1(IP(dst=host) / TCP(sport=RandShort(), dport=port, flags="S"), timeout=timeout, verbose=0)
-    return packet and packet.haslayer(TCP) and packet[TCP].flags == 'SA'
+    """
+    Checks whether the TCP port on the host is in the listening state
+
+    A plain non-blocking connect carries the same information as the raw SYN scan it
+    replaces, but costs one connect_ex syscall plus one select - no raw-socket
+    privileges, no packet-dissection machinery
+
+    :param host: IP address or DNS name of the host
+    :param port: port number to probe
+    :param timeout: maximum duration of the probe in seconds
+
+    :return: True in case the port accepted the connection within the timeout
+    """
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.setblocking(False)
+        error: int = sock.connect_ex((_resolve(host), port))
+        if 0 == error:
+            return True
+        if error not in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+            return False
+
+        _, writable, _ = select.select([], [sock], [], timeout)
+        if not writable:
+            return False
+        return 0 == sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+
+
+TCP_CONNECT_TRY_TIMEOUT: float = 0.5
+BACKOFF_INITIAL: float = 0.05
+BACKOFF_MAX: float = 1.0
+
+
+async def _wait_for_ping(host: str,
+                         timeout: float) -> bool:
+    deadline: float = time.monotonic() + timeout
+    backoff: float = BACKOFF_INITIAL
+    while time.monotonic() < deadline:
+        # ping3 is blocking, so probe from a worker thread to keep the loop responsive
+        if await asyncio.to_thread(ping, host, timeout=TCP_CONNECT_TRY_TIMEOUT):
+            return True
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, BACKOFF_MAX)
+
+    return False
+
+
+async def _probe_tcp_port(host: str,
+                          port: int,
+                          timeout: float) -> bool:
+    """
+    Single-shot TCP connect probe: True in case the port accepted within the timeout
+    """
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port),
+                                           timeout=timeout)
+        writer.close()
+        await writer.wait_closed()
+        return True
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+
+async def _probe_tcp_ports(hosts: List[str],
+                           port: int,
+                           timeout: float) -> List[bool]:
+    """
+    Probes the port on all the hosts concurrently inside one event loop - a single
+    epoll wait collects every connect result, with no thread per host
+
+    :return: per-host open flags, in the order of the input list
+    """
+    return list(await asyncio.gather(*(_probe_tcp_port(host, port, timeout)
+                                       for host in hosts)))
+
+
+async def _wait_for_tcp_port(host: str,
+                             port: int,
+                             timeout: float) -> bool:
+    deadline: float = time.monotonic() + timeout
+    backoff: float = BACKOFF_INITIAL
+    while time.monotonic() < deadline:
+        if await _probe_tcp_port(host, port, TCP_CONNECT_TRY_TIMEOUT):
+            return True
+
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, BACKOFF_MAX)
+
+    return False
+
+
+async def wait_for_host_ready(host: str,
+                              ssh_port: int = 22,
+                              timeout: float = 60.0) -> bool:
+    """
+    Waits until the host both answers ICMP pings and accepts TCP connections on the SSH port
+
+    Both probes run concurrently with capped exponential backoff, so the call returns as
+    soon as the host is fully up instead of paying for two sequential polling passes
+
+    :param host: IP address or DNS name of the host
+    :param ssh_port: TCP port expected to enter the listening state (SSH by default)
+    :param timeout: maximum duration given in seconds of how long the method waits for the host
+
+    :return: True  - the host is pingable and the port is open
+             False - the host did not become ready during the specified interval
+    """
+
+    results = await asyncio.gather(_wait_for_ping(host, timeout),
+                                   _wait_for_tcp_port(host, ssh_port, timeout))
+    return all(results)
+
+
+async def wait_for_hosts_ready(hosts: List[str],
+                               ssh_port: int = 22,
+                               timeout: float = 60.0) -> bool:
+    """
+    Concurrently waits for all the hosts to become ready (see 'wait_for_host_ready')
+
+    :return: True only if every host became reachable within the timeout
+    """
+
+    results = await asyncio.gather(*(wait_for_host_ready(host, ssh_port, timeout) for host in hosts))
+    return all(results)
+
+
+def _ping_many(hosts: List[str],
+               timeout: float) -> List[bool]:
+    """
+    Pings all the hosts in one batched pass
+
+    With icmplib available the whole batch shares a single ICMP socket and one event
+    loop ('privileged=False' uses datagram ICMP, so no root is needed); otherwise the
+    probes fan out over a thread pool with one raw socket per host
+
+    :param hosts: List of hosts: [IP's, DNS names and ext]
+    :param timeout: per-probe timeout in seconds
+
+    :return: per-host reachability flags, in the order of the input list
+    """
+
+    if multiping is not None:
+        return [result.is_alive
+                for result in multiping(hosts, count=1, timeout=timeout, privileged=False)]
+
+    with ThreadPoolExecutor(max_workers=min(64, len(hosts))) as executor:
+        return list(executor.map(lambda host: bool(ping(host, timeout=timeout)), hosts))
 
 
 def wait_for_hosts(hosts: List[str],
@@ -92,11 +343,10 @@ def wait_for_hosts(hosts: List[str],
 
     The method in a loop for a specified period of time checks the availability of hosts passed by the input parameter
     1. uses Ping requests to check the availability of hosts
-    2. If the host is available, this host is removed from the list
-    3. If the list is empty -> returns True
+    2. All the hosts are probed concurrently, so an iteration lasts max(rtt) instead of
+       sum(rtt) and every probe gets the full 'interval_sec' timeout
+    3. Hosts that answered are dropped from the remaining set; if it is empty -> returns True
     4. If not all hosts are available within the specified time interval -> False is returned
-    5. At each iteration, the timeout value for the Ping request is recalculated to ensure that the
-       specified duration of each specific iteration
 
     :param hosts: List of hosts: [IP's, DNS names and ext]
     :param timeout: maximum duration given in seconds of how long the method waits for the hosts to become available
@@ -106,18 +356,15 @@ def wait_for_hosts(hosts: List[str],
              False - not all hosts became available during the specified interval
     """
 
+    pending: List[str] = list(hosts)
     start: float = time.time()
     while timeout > (time.time() - start):
-        # TODO: We may need to remove this division someday
-        # ping timeout = [ 1 sec / 'number of hosts' left in list ]
-        ping_timeout: float = interval_sec / len(hosts)
-        for host in hosts:
-            if ping(host, timeout=ping_timeout):
-                # remove hosts from the list if It's accessible via ping.
-                hosts.remove(host)
-
-        still_unavailable_servers_count: int = len(hosts)
-        if 0 == still_unavailable_servers_count:
+        results: List[bool] = _ping_many(pending, timeout=interval_sec)
+
+        # The remaining set is rebuilt after the pass instead of being mutated
+        # while iterated over (which silently skips the element after a removal)
+        pending = [host for host, alive in zip(pending, results) if not alive]
+        if not pending:
             return True
 
     return False
@@ -131,9 +378,9 @@ def wait_for_ports(hosts: List[str],
     Waits for the specified TCP port to become open (will transfer to the listening state) on the specified server
 
     The method in a loop for a specified period of time, checks is the specified port is available:
-    1. To check is port is in the listening state method send as SYN packet and waits for a SYN+ACK packet in the response
-    2. If the port is opened, this host is removed from the list
-    3. If the hosts list becomes empty -> returns True
+    1. To check is port is in the listening state the method tries a plain TCP connect (see 'is_port_open')
+    2. All the hosts are probed concurrently, so an iteration lasts max(rtt) instead of sum(rtt)
+    3. Hosts whose port answered are dropped from the remaining set; if it is empty -> returns True
     4. If not all host's ports are becomes opened within the specified time interval -> False is returned
     5. At each iteration we're trying to ensure that it should last at least one second
 
@@ -146,15 +393,16 @@ def wait_for_ports(hosts: List[str],
              False - not all hosts became available during the specified interval
     """
 
+    pending: List[str] = list(hosts)
     start: float = time.time()
     while timeout > (time.time() - start):
         iter_start: float = time.time()
-        for host in hosts:
-            if is_port_open(host=host, port=port):
-                hosts.remove(host)
+        # One event loop drives all the connects: no thread per host, and a single
+        # epoll wait delivers every readiness event of the pass
+        results: List[bool] = asyncio.run(_probe_tcp_ports(pending, port, interval_sec))
 
-        still_unavailable_servers_count: int = len(hosts)
-        if 0 == still_unavailable_servers_count:
+        pending = [host for host, is_open in zip(pending, results) if not is_open]
+        if not pending:
             return True
 
         # To ensure that we will not repeat this loop faster than once per second.